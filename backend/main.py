@@ -5,6 +5,7 @@ FastAPI main application for Robusta AI Chatbot
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import os
@@ -15,11 +16,17 @@ import logging
 
 # Import backend modules - Updated to match current working code
 from src.routing_chain import RoutingChain
-from src.llm_models import LLMManager  
+from src.llm_models import get_llm_manager
 from src.sheets_logger import log_chat_to_sheets
 from src.topic_vectordb import search_course_db
 from src.policy_tools import RobustaVectorDB
 
+try:
+    import orjson  # noqa: F401 - ORJSONResponse cần orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponseClass
+except ImportError:
+    DefaultResponseClass = JSONResponse
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,7 +35,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Robusta AI Chatbot API",
     description="AI-powered chatbot for course information and general queries",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=DefaultResponseClass
 )
 
 # CORS configuration for React frontend
@@ -41,7 +49,7 @@ app.add_middleware(
 )
 
 # Initialize components - Using current working logic
-llm_manager = LLMManager()
+llm_manager = get_llm_manager()
 routing_chain = RoutingChain()
 vector_db = RobustaVectorDB()
 
@@ -70,6 +78,12 @@ class HealthResponse(BaseModel):
     version: str
     services: Dict[str, str]
 
+@app.on_event("startup")
+async def warmup_llm_connection():
+    """Mở sẵn connection tới LLM provider để request đầu tiên không chịu TLS handshake"""
+    if await asyncio.to_thread(llm_manager.warmup):
+        logger.info("LLM connection pool warmed up")
+
 # API Routes
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -84,6 +98,34 @@ async def root():
         }
     )
 
+def record_turn(session_id: str, user_message: str, response: str):
+    """Lưu lượt hội thoại vào session memory và log lên sheets"""
+    # Update session memory
+    session_memory[session_id].append({
+        "role": "user", 
+        "content": user_message,
+        "timestamp": datetime.now().isoformat()
+    })
+    session_memory[session_id].append({
+        "role": "assistant", 
+        "content": response,
+        "timestamp": datetime.now().isoformat()
+    })
+    
+    # Keep only last 20 messages per session
+    if len(session_memory[session_id]) > 20:
+        session_memory[session_id] = session_memory[session_id][-20:]
+    
+    # Log to sheets
+    try:
+        log_chat_to_sheets(
+            user_message=user_message,
+            bot_response=response,
+            session_id=session_id
+        )
+    except Exception as e:
+        logger.warning(f"Failed to log to sheets: {e}")
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(message: ChatMessage):
     """Main chat endpoint - Updated with current logic"""
@@ -96,7 +138,7 @@ async def chat(message: ChatMessage):
             session_memory[session_id] = []
         
         # Process message with routing chain
-        result = routing_chain.chat(
+        result = await routing_chain.achat(
             user_input=message.message,
             session_id=session_id,
             enable_logging=True
@@ -106,31 +148,7 @@ async def chat(message: ChatMessage):
         response = result.get('answer', 'Xin lỗi, tôi không thể xử lý yêu cầu này.')
         intent = result.get('intent', 'general')
         
-        # Update session memory
-        session_memory[session_id].append({
-            "role": "user", 
-            "content": message.message,
-            "timestamp": datetime.now().isoformat()
-        })
-        session_memory[session_id].append({
-            "role": "assistant", 
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Keep only last 20 messages per session
-        if len(session_memory[session_id]) > 20:
-            session_memory[session_id] = session_memory[session_id][-20:]
-        
-        # Log to sheets
-        try:
-            log_chat_to_sheets(
-                user_message=message.message,
-                bot_response=response,
-                session_id=session_id
-            )
-        except Exception as e:
-            logger.warning(f"Failed to log to sheets: {e}")
+        record_turn(session_id, message.message, response)
         
         return ChatResponse(
             response=response,
@@ -143,6 +161,34 @@ async def chat(message: ChatMessage):
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """Streaming chat endpoint (SSE) - gửi từng chunk câu trả lời ngay khi LLM sinh ra"""
+    session_id = message.session_id or f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    session_memory.setdefault(session_id, [])
+    
+    async def event_stream():
+        chunks = []
+        try:
+            async for event in routing_chain.achat_stream(
+                user_input=message.message,
+                session_id=session_id,
+                enable_logging=True
+            ):
+                if "delta" in event:
+                    chunks.append(event["delta"])
+                else:
+                    event["session_id"] = session_id
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}")
+            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+        
+        await asyncio.to_thread(record_turn, session_id, message.message, "".join(chunks).strip())
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.post("/api/upload/courses", response_model=CourseUploadResponse)
 async def upload_courses(files: List[UploadFile] = File(...)):
     """Upload multiple course PDF files"""
@@ -7,7 +7,7 @@ import logging
 from typing import Dict, List, Optional, Tuple
 from langchain.prompts import PromptTemplate
 from langchain.schema import HumanMessage
-from ..llm_models import llm_manager
+from ..llm_models import get_llm_manager
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +15,7 @@ class AICourseProcessor:
     """Xử lý nội dung khóa học bằng AI thay vì rules cứng"""
     
     def __init__(self):
-        self.llm = llm_manager.get_llm()
+        self.llm = get_llm_manager().get_llm()
         
         # Template để phân tích và dịch nội dung PDF
         self.analysis_prompt = PromptTemplate(
@@ -4,90 +4,333 @@ LLM: OpenRouter/Groq | Embeddings: Gemini text-embedding-004
 """
 
 import os
-from typing import Optional
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
+import asyncio
+import logging
+import atexit
+import functools
+import importlib.util
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import SystemMessage
 from dotenv import load_dotenv
 
-load_dotenv()
+# Provider modules nặng, chỉ import khi thực sự khởi tạo provider tương ứng
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from langchain_groq import ChatGroq
 
-class LLMManager:
-    """Quản lý LLM (OpenRouter/Groq) và Embeddings (Gemini)"""
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=None)
+def _load_env() -> None:
+    """Parse .env đúng một lần mỗi process"""
+    load_dotenv(override=False)
+
+# Shared HTTP connection pool cho mọi LLM client - tránh TCP+TLS handshake mới cho mỗi request
+_HTTP_TIMEOUT = httpx.Timeout(120.0)
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None  # httpx[http2]
+_HTTP_CLIENTS = {}  # (max_connections, max_keepalive, keepalive_expiry, retries, http2) -> (Client, AsyncClient)
+
+def _get_http_clients(max_connections: int, max_keepalive: int, keepalive_expiry: float,
+                      retries: int = 0, http2: bool = False):
+    """Trả về cặp (Client, AsyncClient) dùng chung cho cấu hình pool đã cho"""
+    http2 = http2 and _HTTP2_AVAILABLE
+    key = (max_connections, max_keepalive, keepalive_expiry, retries, http2)
+    clients = _HTTP_CLIENTS.get(key)
+    if clients is None:
+        limits = httpx.Limits(
+            max_keepalive_connections=max_keepalive,
+            max_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        # Retry ở tầng transport (connect errors) - dùng lại pool thay vì client mới mỗi lần retry
+        clients = (
+            httpx.Client(transport=httpx.HTTPTransport(limits=limits, retries=retries), timeout=_HTTP_TIMEOUT),
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(limits=limits, retries=retries, http2=http2),
+                timeout=_HTTP_TIMEOUT
+            )
+        )
+        _HTTP_CLIENTS[key] = clients
+    return clients
+
+def _close_http_clients():
+    """Đóng shared HTTP clients khi process thoát"""
+    for client, async_client in _HTTP_CLIENTS.values():
+        client.close()
+        try:
+            asyncio.run(async_client.aclose())
+        except Exception:
+            pass
+
+atexit.register(_close_http_clients)
+
+# (provider, env var chứa API key - field LLMConfig tương ứng là tên viết thường) theo thứ tự ưu tiên khi LLM_PROVIDER=auto
+PROVIDERS = [("groq", "GROQ_API_KEY"), ("openrouter", "OPENROUTER_API_KEY")]
+
+@dataclass(frozen=True, slots=True)
+class LLMConfig:
+    """Config LLM/Embeddings đọc từ env (đã ép kiểu)"""
+    # LLM Provider selection - priority: groq -> openrouter -> fallback
+    llm_provider: str  # "groq", "openrouter", or "auto"
+
+    # OpenRouter configuration
+    openrouter_api_key: Optional[str]
+    openrouter_model: str
+
+    # Groq configuration
+    groq_api_key: Optional[str]
+    groq_model: str
+
+    # Gemini configuration for Embeddings only
+    google_api_key: Optional[str]
+    embedding_model: str
+    embedding_transport: str  # "grpc" hoặc "rest"
+    embedding_cache_enabled: bool
+    embedding_cache_dir: str
+
+    # Common settings
+    temperature: float
+    max_tokens: int
+
+    # HTTP connection pool
+    pool_max: int
+    pool_keepalive: int
+    pool_expiry: float
+    http_retries: int
+    http2_enabled: bool  # cần httpx[http2], chỉ áp dụng cho async client
+
+    # Response cache (opt-in) - prompt giống hệt trả về ngay không gọi API
+    llm_cache_enabled: bool
+    llm_cache_path: str
+
+    # Semantic cache (opt-in) - prompt gần giống (paraphrase) cũng hit cache, cần Redis
+    semantic_cache_enabled: bool
+    redis_url: str
+    semantic_cache_threshold: float
     
-    def __init__(self):
+    # Provider endpoints
+    openrouter_base_url: str = "https://openrouter.ai/api/v1"
+    groq_base_url: str = "https://api.groq.com/openai/v1"
+
+@functools.lru_cache(maxsize=1)
+def load_config() -> LLMConfig:
+    """Đọc và parse env đúng một lần mỗi process"""
+    _load_env()
+    env = os.environ  # local reference, đọc tất cả config trong một lượt
+    return LLMConfig(
         # LLM Provider selection - priority: groq -> openrouter -> fallback
-        self.llm_provider = os.getenv("LLM_PROVIDER", "auto")  # "groq", "openrouter", or "auto"
-        
+        llm_provider=env.get("LLM_PROVIDER", "auto"),
+
         # OpenRouter configuration
-        self.openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
-        self.openrouter_model = os.getenv("OPENROUTER_MODEL", "openai/gpt-4o-mini")
-        self.openrouter_base_url = "https://openrouter.ai/api/v1"
-        
+        openrouter_api_key=env.get("OPENROUTER_API_KEY"),
+        openrouter_model=env.get("OPENROUTER_MODEL", "openai/gpt-4o-mini"),
+
         # Groq configuration
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.groq_model = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile")
-        
+        groq_api_key=env.get("GROQ_API_KEY"),
+        groq_model=env.get("GROQ_MODEL", "llama-3.1-70b-versatile"),
+
         # Gemini configuration for Embeddings only
-        self.google_api_key = os.getenv("GOOGLE_API_KEY")
-        self.embedding_model = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
-        
+        google_api_key=env.get("GOOGLE_API_KEY"),
+        embedding_model=env.get("EMBEDDING_MODEL", "models/text-embedding-004"),
+        embedding_transport=env.get("EMBEDDING_TRANSPORT", "grpc"),
+        embedding_cache_enabled=env.get("EMBEDDING_CACHE", "1") == "1",
+        embedding_cache_dir=env.get("EMBEDDING_CACHE_DIR", ".emb_cache"),
+
         # Common settings
-        self.temperature = float(os.getenv("TEMPERATURE", "0.3"))
-        self.max_tokens = int(os.getenv("MAX_TOKENS", "1000"))
+        temperature=float(env.get("TEMPERATURE", "0.3")),
+        max_tokens=int(env.get("MAX_TOKENS", "1000")),
+
+        # HTTP connection pool
+        pool_max=int(env.get("LLM_POOL_MAX_CONNECTIONS", "100")),
+        pool_keepalive=int(env.get("LLM_POOL_KEEPALIVE", "20")),
+        pool_expiry=float(env.get("LLM_POOL_EXPIRY", "30")),
+        http_retries=int(env.get("LLM_RETRIES", "2")),
+        http2_enabled=env.get("LLM_HTTP2", "1") == "1",
+
+        # Response cache (opt-in) - prompt giống hệt trả về ngay không gọi API
+        llm_cache_enabled=env.get("LLM_CACHE", "0") == "1",
+        llm_cache_path=env.get("LLM_CACHE_PATH", ".llm_cache.db"),
+
+        # Semantic cache (opt-in) - prompt gần giống (paraphrase) cũng hit cache, cần Redis
+        semantic_cache_enabled=env.get("SEM_CACHE", "0") == "1",
+        redis_url=env.get("REDIS_URL", "redis://localhost:6379"),
+        semantic_cache_threshold=float(env.get("SEM_CACHE_THRESH", "0.08"))
+    )
+
+class LLMManager:
+    """Quản lý LLM (OpenRouter/Groq) và Embeddings (Gemini)
+
+    HTTP pool (env): LLM_POOL_MAX_CONNECTIONS=100, LLM_POOL_KEEPALIVE=20, LLM_POOL_EXPIRY=30 (giây),
+    LLM_RETRIES=2, LLM_HTTP2=1
+    """
+    
+    def __init__(self):
+        self.cfg = cfg = load_config()
         
-        # Auto-detect available provider if set to auto
+        # Chọn provider và validate API key trong một lượt
+        self.llm_provider = cfg.llm_provider
+        provider_keys = dict(PROVIDERS)
         if self.llm_provider == "auto":
-            if self.groq_api_key:
-                self.llm_provider = "groq"
-                print("🤖 Using Groq as LLM provider")
-            elif self.openrouter_api_key:
-                self.llm_provider = "openrouter" 
-                print("🤖 Using OpenRouter as LLM provider")
-            else:
+            self.llm_provider = next((name for name, key in PROVIDERS if getattr(cfg, key.lower())), None)
+            if self.llm_provider is None:
                 raise ValueError("No LLM API key found. Please provide GROQ_API_KEY or OPENROUTER_API_KEY")
+        elif self.llm_provider not in provider_keys:
+            raise ValueError(f"Unsupported LLM_PROVIDER: {self.llm_provider}")
+        elif not getattr(cfg, provider_keys[self.llm_provider].lower()):
+            raise ValueError(f"{provider_keys[self.llm_provider]} not found in environment variables")
+        
+        # Kwargs cố định của từng provider, tính một lần
+        self._groq_kwargs = dict(
+            model=cfg.groq_model,
+            groq_api_key=cfg.groq_api_key,
+            temperature=cfg.temperature,
+            max_tokens=cfg.max_tokens,
+            max_retries=cfg.http_retries  # SDK retry 429/5xx/timeout; transport chỉ retry lỗi kết nối
+        )
+        self._openrouter_kwargs = dict(
+            model=cfg.openrouter_model,
+            openai_api_key=cfg.openrouter_api_key,
+            openai_api_base=cfg.openrouter_base_url,
+            temperature=cfg.temperature,
+            max_tokens=cfg.max_tokens,
+            max_retries=cfg.http_retries  # SDK retry 429/5xx/timeout; transport chỉ retry lỗi kết nối
+        )
+        
+        llm_builders = {"groq": self._get_groq_llm, "openrouter": self._get_openrouter_llm}
+        self._build_llm = llm_builders[self.llm_provider]
         
-        # Validate based on selected provider
-        if self.llm_provider == "groq" and not self.groq_api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-        elif self.llm_provider == "openrouter" and not self.openrouter_api_key:
-            raise ValueError("OPENROUTER_API_KEY not found in environment variables")
-            
-        if not self.google_api_key:
+        if not cfg.google_api_key:
             raise ValueError("GOOGLE_API_KEY required for embeddings")
+        
+        # Client instances được tạo một lần rồi dùng lại (giữ connection pool)
+        self._llm = None
+        self._llm_cache = None
+        self._embeddings = None
+        
+        logger.info("Using %s as LLM provider", self.llm_provider)
     
     def get_llm(self):
-        """Khởi tạo LLM theo provider được chọn"""
-        if self.llm_provider == "groq":
-            return self._get_groq_llm()
-        else:
-            return self._get_openrouter_llm()
+        """Trả về LLM theo provider được chọn, khởi tạo ở lần gọi đầu tiên"""
+        if self._llm is None:
+            self._llm_cache = self._build_llm_cache()
+            self._llm = self._build_llm()
+        return self._llm
+    
+    def get_async_llm(self):
+        """LLM cho code path `async def` - cùng instance với get_llm() (ainvoke/astream đã dùng shared AsyncClient pool)"""
+        return self.get_llm()
+    
+    def system_message(self, text: str) -> SystemMessage:
+        """System message cho phần prompt tĩnh - đánh dấu cache_control khi provider hỗ trợ
+
+        cache_control chỉ OpenRouter (Anthropic/Gemini) hiểu; Groq/OpenAI tự cache prefix giống nhau
+        """
+        if self.llm_provider == "openrouter":
+            return SystemMessage(content=[
+                {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+            ])
+        return SystemMessage(content=text)
+    
+    def warmup(self) -> bool:
+        """Mở sẵn connection (TCP+TLS) tới provider trong shared pool trước request đầu tiên"""
+        base_url = self.cfg.groq_base_url if self.llm_provider == "groq" else self.cfg.openrouter_base_url
+        http_client, _ = self._http_clients()
+        try:
+            http_client.get(f"{base_url}/models", timeout=2.0)
+            return True
+        except Exception:
+            return False  # offline/dev - bỏ qua
+    
+    def _http_clients(self):
+        """Shared (Client, AsyncClient) theo cấu hình pool của manager"""
+        return _get_http_clients(self.cfg.pool_max, self.cfg.pool_keepalive, self.cfg.pool_expiry,
+                                 self.cfg.http_retries, self.cfg.http2_enabled)
+    
+    def _build_llm_cache(self):
+        """Response cache: semantic (Redis) nếu SEM_CACHE=1, ngược lại SQLite exact-match nếu LLM_CACHE=1"""
+        if self.cfg.semantic_cache_enabled:
+            from langchain_community.cache import RedisSemanticCache
+            return RedisSemanticCache(
+                redis_url=self.cfg.redis_url,
+                embedding=self.get_embeddings(),
+                score_threshold=self.cfg.semantic_cache_threshold
+            )
+        if not self.cfg.llm_cache_enabled:
+            return None
+        from langchain_community.cache import SQLiteCache
+        return SQLiteCache(database_path=self.cfg.llm_cache_path)
     
-    def _get_groq_llm(self) -> ChatGroq:
+    def _get_groq_llm(self) -> "ChatGroq":
         """Khởi tạo Groq LLM"""
+        from langchain_groq import ChatGroq
+        http_client, http_async_client = self._http_clients()
         return ChatGroq(
-            model=self.groq_model,
-            groq_api_key=self.groq_api_key,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens
+            **self._groq_kwargs,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            cache=self._llm_cache
         )
     
-    def _get_openrouter_llm(self) -> ChatOpenAI:
+    def _get_openrouter_llm(self) -> "ChatOpenAI":
         """Khởi tạo OpenRouter LLM"""
+        from langchain_openai import ChatOpenAI
+        http_client, http_async_client = self._http_clients()
         return ChatOpenAI(
-            model=self.openrouter_model,
-            openai_api_key=self.openrouter_api_key,
-            openai_api_base=self.openrouter_base_url,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens
+            **self._openrouter_kwargs,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            cache=self._llm_cache
         )
     
-    def get_embeddings(self) -> GoogleGenerativeAIEmbeddings:
-        """Khởi tạo Gemini Embeddings"""
-        return GoogleGenerativeAIEmbeddings(
-            model=self.embedding_model,
-            google_api_key=self.google_api_key
+    def get_embeddings(self) -> Embeddings:
+        """Trả về Gemini Embeddings (có cache theo nội dung text), khởi tạo ở lần gọi đầu tiên"""
+        if self._embeddings is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            embeddings = GoogleGenerativeAIEmbeddings(
+                model=self.cfg.embedding_model,
+                google_api_key=self.cfg.google_api_key,
+                transport=self.cfg.embedding_transport
+            )
+            if self.cfg.embedding_cache_enabled:
+                embeddings = self._wrap_embeddings_cache(embeddings)
+            self._embeddings = embeddings
+        return self._embeddings
+    
+    def _wrap_embeddings_cache(self, embeddings: Embeddings) -> Embeddings:
+        """Cache vector theo SHA-256(text) trên disk, namespace theo model để đổi model không dùng nhầm cache"""
+        from langchain.embeddings import CacheBackedEmbeddings
+        from langchain.storage import LocalFileStore
+        
+        store = LocalFileStore(self.cfg.embedding_cache_dir)
+        return CacheBackedEmbeddings.from_bytes_store(
+            embeddings,
+            store,
+            namespace=self.cfg.embedding_model,
+            query_embedding_cache=True,
+            key_encoder="sha256"
         )
+    
+    async def aembed_batch(self, texts: List[str], concurrency: int = 32) -> List[List[float]]:
+        """Embed nhiều texts đồng thời (tối đa `concurrency` request cùng lúc), giữ nguyên thứ tự"""
+        embeddings = self.get_embeddings()
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _embed_one(text: str) -> List[float]:
+            async with semaphore:
+                return await embeddings.aembed_query(text)
+        
+        return await asyncio.gather(*[_embed_one(text) for text in texts])
+
+@functools.lru_cache(maxsize=1)
+def get_llm_manager() -> LLMManager:
+    """Singleton LLMManager, chỉ khởi tạo (đọc env, validate keys) ở lần dùng đầu tiên"""
+    return LLMManager()
 
-# Singleton instance
-llm_manager = LLMManager()
+def __getattr__(name: str):
+    # Legacy compatibility: `from llm_models import llm_manager` vẫn hoạt động nhưng lazy
+    if name == "llm_manager":
+        return get_llm_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
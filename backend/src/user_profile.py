@@ -2,19 +2,15 @@
 User Profile Data Structures
 """
 
-from typing import List
+from typing import Tuple
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserProfile:
-    """User profile for course matching"""
+    """User profile for course matching (immutable, hashable)"""
     work_field: str = ""  # Lĩnh vực làm việc
-    current_skills: List[str] = None  # Kỹ năng hiện có
+    current_skills: Tuple[str, ...] = ()  # Kỹ năng hiện có
     goal: str = ""  # Mục tiêu sau khóa học
     experience_level: str = ""  # Beginner, Intermediate, Advanced
     time_availability: str = ""  # Part-time, Full-time
     budget: str = ""  # Budget range
-    
-    def __post_init__(self):
-        if self.current_skills is None:
-            self.current_skills = []
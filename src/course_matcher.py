@@ -15,12 +15,12 @@ if current_dir not in sys.path:
 
 try:
     from smart_course_analyzer import smart_analyzer
-    from llm_models import llm_manager
+    from llm_models import get_llm_manager
     from user_profile import UserProfile
 except ImportError as e:
     print(f"Import error in course_matcher.py: {e}")
     smart_analyzer = None
-    llm_manager = None
+    get_llm_manager = None
 
 class CourseMatchingService:
     """Service để match khóa học với qualification check logic"""
@@ -41,8 +41,8 @@ class CourseMatchingService:
 💡 **Với thông tin này, mình sẽ tư vấn khóa học cụ thể và phù hợp nhất!**"""
     
     def __init__(self):
-        if llm_manager:
-            self.llm = llm_manager.get_llm()
+        if get_llm_manager:
+            self.llm = get_llm_manager().get_llm()
         else:
             self.llm = None
     
@@ -83,7 +83,7 @@ CHỈ TRẢ VỀ JSON, KHÔNG GIẢI THÍCH THÊM.
             
             return UserProfile(
                 work_field=profile_data.get("work_field", ""),
-                current_skills=profile_data.get("current_skills", []),
+                current_skills=tuple(profile_data.get("current_skills") or ()),
                 goal=profile_data.get("goal", ""),
                 experience_level=profile_data.get("experience_level", ""),
                 time_availability=profile_data.get("time_availability", ""),
@@ -5,11 +5,144 @@ Handles structured extraction of course information from cleaned text
 
 import re
 import logging
+import functools
+from dataclasses import dataclass, fields
 from typing import Dict, List, Optional
 from .text_cleaner import TextCleaner
 
 logger = logging.getLogger(__name__)
 
+# Tăng version khi thay đổi section_configs hoặc regex patterns để vô hiệu hóa cache cũ
+EXTRACTOR_VERSION = 1
+
+# Header patterns dùng chung cho mọi section
+_ROMAN_HDR_RE = re.compile(r'^[ivx]+\.\s*', re.IGNORECASE | re.MULTILINE)
+_NUMBERED_HDR_RE = re.compile(r'^\d+\.\s*', re.IGNORECASE | re.MULTILINE)
+
+# Generic section boundaries (Roman numerals, numbered sections starting with capital)
+_GENERIC_STOP_RES = [
+    re.compile(r'\n\s*[ivx]+\.\s*[a-zA-ZÀ-ỹ]', re.IGNORECASE),
+    re.compile(r'\n\s*\d+\.\s*[A-ZÀÁẢÃẠ]', re.IGNORECASE),
+]
+
+# Patterns cho _extract_precise_section*, sắp theo thứ tự ưu tiên: dạng Roman numeral/cụ thể
+# trước, fallback rộng (quét DOTALL toàn document) sau cùng. Pattern đầu tiên match sẽ thắng.
+_SECTION1_INTRO_RES = [
+    re.compile(r'I\.\s*(?:Giới thiệu|Tổng quan).*?(?=II\.|III\.|Thời lượng|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'(?:Giới thiệu|Tổng quan)(?:\s+về)?\s+(?:khóa học|khoá học).*?(?=II\.|Thời lượng|Mục tiêu|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'OpenStack là.*?(?=II\.|Thời lượng|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Khóa học.*?cung cấp.*?(?=II\.|Thời lượng|Mục tiêu|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Trong bối cảnh.*?(?=II\.|Thời lượng|Mục tiêu|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION1_DURATION_RES = [
+    re.compile(r'II\.\s*Thời lượng.*?(?=III\.|IV\.|Hình thức|Mục tiêu|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Thời lượng(?:\s+khóa học)?:.*?(?:giờ|ngày|tuần).*?(?=III\.|IV\.|Hình thức|Mục tiêu|Đối tượng|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION1_FALLBACK_RES = [
+    re.compile(r'(?:khóa học|khoá học).*?(?:cung cấp|giúp|trang bị).*?(?=Mục tiêu|Đối tượng|\d+\.|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'[A-Z][a-z]+ là.*?(?=Mục tiêu|Đối tượng|\d+\.|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Trong bối cảnh.*?(?=Mục tiêu|Đối tượng|\d+\.|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION2_OBJECTIVES_RES = [
+    re.compile(r'IV\.\s*Mục tiêu.*?(?=V\.|VI\.|Đối tượng|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Mục tiêu khóa học.*?(?=V\.|Đối tượng|Điều kiện|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Kết thúc khóa học.*?(?=V\.|Đối tượng|$)', re.DOTALL | re.IGNORECASE),
+    # Fallback: tìm bất kỳ text nào nói về mục tiêu
+    re.compile(r'.*?học viên.*?(?:nắm|hiểu|có thể|sẽ).*?(?=Đối tượng|Điều kiện|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION2_AUDIENCE_RES = [
+    re.compile(r'III\.\s*Đối tượng.*?(?=IV\.|V\.|Yêu cầu|Điều kiện|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'V\.\s*Đối tượng.*?(?=VI\.|VII\.|Điều kiện|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+    # Special pattern for "Đối tượng học:" - cụ thể hơn nên thử trước pattern chung
+    re.compile(r'Đối tượng học\s*:.*?(?=IV\.|V\.|Yêu cầu|Điều kiện|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Đối tượng(?:\s+tham gia|\s+học)?.*?(?=IV\.|V\.|VI\.|Yêu cầu|Điều kiện|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION2_PREREQ_RES = [
+    re.compile(r'IV\.\s*(?:Yêu cầu|Điều kiện).*?(?=V\.|VI\.|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'VI\.\s*Điều kiện.*?(?=VII\.|VIII\.|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'(?:Điều kiện tiên quyết|Yêu cầu trước khóa học).*?(?=V\.|VI\.|VII\.|Nội dung|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION2_FALLBACK_RES = [
+    re.compile(r'.*?(?:Quản trị|Admin|Developer|Kỹ sư|Chuyên viên).*?(?=Nội dung|\d+\.|$)', re.DOTALL | re.IGNORECASE),
+    re.compile(r'.*?(?:kiến thức|kinh nghiệm|yêu cầu).*?(?:Linux|cơ bản|nền tảng).*?(?=Nội dung|\d+\.|$)', re.DOTALL | re.IGNORECASE),
+]
+_SECTION3_CONTENT_RES = [
+    # V. (most common), VI./VII. (alternative numbering) - chung phần đuôi nên gộp thành một lần quét
+    re.compile(r'(?:V|VI|VII)\.\s*Nội dung.*', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Nội dung khóa học.*', re.DOTALL | re.IGNORECASE),
+    re.compile(r'\d+\.\s*(?:Introduction|Tổng quan|Overview).*', re.DOTALL | re.IGNORECASE),  # First module
+    re.compile(r'Module\s*1.*', re.DOTALL | re.IGNORECASE),  # Module-based content
+    re.compile(r'Chương\s*1.*', re.DOTALL | re.IGNORECASE),  # Chapter-based content
+]
+_SECTION3_MODULE_RES = [
+    re.compile(r'1\.\s*.*?(?:\n2\.|$)', re.DOTALL | re.IGNORECASE),  # Look for "1. ..." patterns
+    re.compile(r'Module.*?1.*', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Introduction to.*', re.DOTALL | re.IGNORECASE),
+    re.compile(r'Hadoop.*Installation.*', re.DOTALL | re.IGNORECASE),
+    re.compile(r'HDFS.*Components.*', re.DOTALL | re.IGNORECASE),
+]
+
+@dataclass(slots=True, frozen=True)
+class RawSections:
+    """Nội dung 5 sections thô tách theo section_configs"""
+    overview: str = ""
+    duration: str = ""
+    objectives: str = ""
+    audience: str = ""
+    content: str = ""
+
+@dataclass(slots=True, frozen=True)
+class FixedSections:
+    """3 sections cố định dùng để tạo Documents"""
+    section1_intro_duration: str = ""
+    section2_objectives_audience: str = ""
+    section3_content: str = ""
+    
+    def to_dict(self) -> Dict[str, str]:
+        """Convert sang dict cho Document/metadata boundary"""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+def _search_section(pattern: re.Pattern, text: str) -> Optional[re.Match]:
+    """Search một section pattern, giới hạn phạm vi quét DOTALL khi có thể"""
+    # Pattern mở đầu bằng '.*?' (DOTALL) nếu match được thì luôn match được từ vị trí 0,
+    # nên match() cho cùng kết quả mà không phải thử lại search ở từng vị trí (O(n²) khi miss)
+    if pattern.pattern.startswith('.*?'):
+        return pattern.match(text)
+    return pattern.search(text)
+
+def _collapse_blank_lines(text: str) -> str:
+    """Tương đương re.sub(r'\n\s*\n\s*\n+', '\n\n', text) trong một lượt duyệt"""
+    # Fast path: cần ít nhất 3 newline mới có thể match
+    if text.count('\n') < 3:
+        return text
+    
+    parts = []
+    last = 0
+    n = len(text)
+    i = text.find('\n')
+    while i != -1:
+        # Duyệt hết whitespace run bắt đầu từ newline này
+        j = i
+        last_newline = i
+        newline_count = 0
+        while j < n and text[j].isspace():
+            if text[j] == '\n':
+                newline_count += 1
+                last_newline = j
+            j += 1
+        
+        if newline_count >= 3:
+            parts.append(text[last:i])
+            parts.append('\n\n')
+            last = last_newline + 1
+        
+        i = text.find('\n', j)
+    
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return ''.join(parts)
+
 class CourseInfoExtractor:
     """Extract thông tin khóa học có cấu trúc từ PDF với logic chuẩn"""
     
@@ -71,6 +204,20 @@ class CourseInfoExtractor:
                 "stop_patterns": []  # Last section, no stop patterns
             }
         }
+        
+        # Compile header patterns một lần, title của section cố định từ lúc init
+        self._header_patterns_by_section = {
+            name: [
+                re.compile(rf'{re.escape(config["title"])}:?', re.IGNORECASE | re.MULTILINE),
+                _ROMAN_HDR_RE,
+                _NUMBERED_HDR_RE,
+            ]
+            for name, config in self.section_configs.items()
+        }
+        self._stop_patterns_by_section = {
+            name: [re.compile(p, re.IGNORECASE | re.MULTILINE) for p in config["stop_patterns"]]
+            for name, config in self.section_configs.items()
+        }
     
     def find_section_boundaries(self, text: str, section_name: str) -> Optional[tuple]:
         """Find start and end positions for a section with precise boundary detection"""
@@ -103,27 +250,20 @@ class CourseInfoExtractor:
             return None
         
         # Find end position using stop patterns
+        # Search bằng pos thay vì slice text[start_pos + offset:] để tránh copy phần đuôi document
         end_pos = len(text)
         
-        if config["stop_patterns"]:
-            for stop_pattern in config["stop_patterns"]:
-                # Look for stop pattern after the start position + some offset
-                search_text = text[start_pos + 50:]  # Skip 50 chars to avoid matching same section
-                stop_match = re.search(stop_pattern, search_text, re.IGNORECASE | re.MULTILINE)
-                if stop_match:
-                    end_pos = min(end_pos, start_pos + 50 + stop_match.start())
-        
-        # Also try generic section boundaries (Roman numerals, etc.)
-        search_text = text[start_pos + 100:]  # Larger offset for generic patterns
-        generic_stops = [
-            r'\n\s*[ivx]+\.\s*[a-zA-ZÀ-ỹ]',  # Roman numerals
-            r'\n\s*\d+\.\s*[A-ZÀÁẢÃẠ]',      # Numbered sections starting with capital
-        ]
+        for stop_pattern in self._stop_patterns_by_section[section_name]:
+            # Skip 50 chars to avoid matching same section
+            stop_match = stop_pattern.search(text, start_pos + 50)
+            if stop_match:
+                end_pos = min(end_pos, stop_match.start())
         
-        for stop_pattern in generic_stops:
-            stop_match = re.search(stop_pattern, search_text, re.IGNORECASE)
+        # Also try generic section boundaries (Roman numerals, etc.) - larger offset
+        for stop_pattern in _GENERIC_STOP_RES:
+            stop_match = stop_pattern.search(text, start_pos + 100)
             if stop_match:
-                end_pos = min(end_pos, start_pos + 100 + stop_match.start())
+                end_pos = min(end_pos, stop_match.start())
         
         logger.debug(f"Section {section_name}: start={start_pos} ({start_method}), end={end_pos}, length={end_pos-start_pos}")
         
@@ -136,22 +276,13 @@ class CourseInfoExtractor:
         if not boundaries:
             return ""
         
-        start_pos, end_pos = boundaries
-        section_text = text[start_pos:end_pos]
-        
         # Clean the extracted section
-        cleaned_text = self.text_cleaner.clean_text(section_text)
+        start_pos, end_pos = boundaries
+        cleaned_text = self.text_cleaner.clean_text_range(text, start_pos, end_pos)
         
         # Remove section header from content
-        config = self.section_configs[section_name]
-        header_patterns = [
-            rf'{re.escape(config["title"])}:?',
-            r'^[ivx]+\.\s*',  # Roman numerals
-            r'^\d+\.\s*',     # Numbers
-        ]
-        
-        for pattern in header_patterns:
-            cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.IGNORECASE | re.MULTILINE)
+        for pattern in self._header_patterns_by_section[section_name]:
+            cleaned_text = pattern.sub('', cleaned_text)
         
         # Section-specific post-processing
         cleaned_text = self.post_process_section(cleaned_text, section_name)
@@ -177,46 +308,31 @@ class CourseInfoExtractor:
             content = re.sub(r'(?:^|\n)([^•\n])', r'\n• \1', content)
         
         # Final cleanup
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+        content = _collapse_blank_lines(content)
         return content.strip()
     
-    def _create_fixed_sections(self, raw_sections: Dict[str, str], full_text: str) -> Dict[str, str]:
+    def _create_fixed_sections(self, raw_sections: RawSections, full_text: str) -> FixedSections:
         """Tạo chính xác 3 sections cố định từ raw sections với boundaries chính xác"""
-        fixed_sections = {}
-        
         # Clean full text first để đảm bảo không có company noise
         cleaned_full_text = self.text_cleaner.clean_text(full_text)
         
-        # SECTION 1: Giới thiệu & Thời lượng
-        section1_content = self._extract_precise_section1(cleaned_full_text, raw_sections)
-        fixed_sections["section1_intro_duration"] = section1_content
-        
-        # SECTION 2: Mục tiêu & Đối tượng & Điều kiện  
-        section2_content = self._extract_precise_section2(cleaned_full_text, raw_sections)
-        fixed_sections["section2_objectives_audience"] = section2_content
-        
-        # SECTION 3: Nội dung khóa học
-        section3_content = self._extract_precise_section3(cleaned_full_text, raw_sections)
-        fixed_sections["section3_content"] = section3_content
-        
-        return fixed_sections
+        return FixedSections(
+            # SECTION 1: Giới thiệu & Thời lượng
+            section1_intro_duration=self._extract_precise_section1(cleaned_full_text, raw_sections),
+            # SECTION 2: Mục tiêu & Đối tượng & Điều kiện
+            section2_objectives_audience=self._extract_precise_section2(cleaned_full_text, raw_sections),
+            # SECTION 3: Nội dung khóa học
+            section3_content=self._extract_precise_section3(cleaned_full_text, raw_sections),
+        )
     
-    def _extract_precise_section1(self, text: str, raw_sections: Dict[str, str]) -> str:
+    def _extract_precise_section1(self, text: str, raw_sections: RawSections) -> str:
         """Extract chính xác section 1: Giới thiệu + Thời lượng (LOẠI BỎ Hình thức đào tạo)"""
         parts = []
         
         # 1. Tìm phần giới thiệu
-        intro_patterns = [
-            r'I\.\s*(?:Giới thiệu|Tổng quan).*?(?=II\.|III\.|Thời lượng|$)',
-            r'(?:Giới thiệu|Tổng quan)(?:\s+về)?\s+(?:khóa học|khoá học).*?(?=II\.|Thời lượng|Mục tiêu|$)',
-            r'OpenStack là.*?(?=II\.|Thời lượng|$)',
-            r'Khóa học.*?cung cấp.*?(?=II\.|Thời lượng|Mục tiêu|$)',
-            r'Trong bối cảnh.*?(?=II\.|Thời lượng|Mục tiêu|$)'
-        ]
-        
         intro_text = ""
-        for pattern in intro_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION1_INTRO_RES:
+            match = _search_section(pattern, text)
             if match:
                 intro_text = match.group().strip()
                 # Clean section header
@@ -228,14 +344,9 @@ class CourseInfoExtractor:
             parts.append(f"Tổng quan khóa học:\n{intro_text}")
         
         # 2. Tìm phần thời lượng (BỎ QUA hình thức đào tạo)
-        duration_patterns = [
-            r'II\.\s*Thời lượng.*?(?=III\.|IV\.|Hình thức|Mục tiêu|$)',
-            r'Thời lượng(?:\s+khóa học)?:.*?(?:giờ|ngày|tuần).*?(?=III\.|IV\.|Hình thức|Mục tiêu|Đối tượng|$)'
-        ]
-        
         duration_text = ""
-        for pattern in duration_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION1_DURATION_RES:
+            match = _search_section(pattern, text)
             if match:
                 duration_text = match.group().strip()
                 # Clean section headers
@@ -256,36 +367,22 @@ class CourseInfoExtractor:
         # Đảm bảo không trả về generic fallback text
         if not result or len(result.strip()) < 50:
             # Thử tìm bất kỳ text nào có ý nghĩa
-            meaningful_patterns = [
-                r'(?:khóa học|khoá học).*?(?:cung cấp|giúp|trang bị).*?(?=Mục tiêu|Đối tượng|\d+\.|$)',
-                r'[A-Z][a-z]+ là.*?(?=Mục tiêu|Đối tượng|\d+\.|$)',
-                r'Trong bối cảnh.*?(?=Mục tiêu|Đối tượng|\d+\.|$)'
-            ]
-            
-            for pattern in meaningful_patterns:
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+            for pattern in _SECTION1_FALLBACK_RES:
+                match = _search_section(pattern, text)
                 if match:
                     result = f"Tổng quan khóa học:\n{match.group().strip()}"
                     break
         
         return result if result else "Thông tin giới thiệu và thời lượng khóa học."
     
-    def _extract_precise_section2(self, text: str, raw_sections: Dict[str, str]) -> str:
+    def _extract_precise_section2(self, text: str, raw_sections: RawSections) -> str:
         """Extract chính xác section 2: Mục tiêu + Đối tượng + Điều kiện - ENHANCED"""
         parts = []
         
         # 1. Tìm mục tiêu khóa học (flexible patterns)
-        objectives_patterns = [
-            r'IV\.\s*Mục tiêu.*?(?=V\.|VI\.|Đối tượng|$)',
-            r'Mục tiêu khóa học.*?(?=V\.|Đối tượng|Điều kiện|$)',
-            r'Kết thúc khóa học.*?(?=V\.|Đối tượng|$)',
-            # Fallback: tìm bất kỳ text nào nói về mục tiêu
-            r'.*?học viên.*?(?:nắm|hiểu|có thể|sẽ).*?(?=Đối tượng|Điều kiện|Nội dung|$)'
-        ]
-        
         objectives_text = ""
-        for pattern in objectives_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION2_OBJECTIVES_RES:
+            match = _search_section(pattern, text)
             if match:
                 objectives_text = match.group().strip()
                 objectives_text = re.sub(r'^IV\.\s*Mục tiêu.*?:\s*', '', objectives_text, flags=re.IGNORECASE)
@@ -296,17 +393,9 @@ class CourseInfoExtractor:
             parts.append(f"Mục tiêu khóa học:\n{objectives_text}")
         
         # 2. Tìm đối tượng tham gia (enhanced patterns for various formats)
-        audience_patterns = [
-            r'III\.\s*Đối tượng.*?(?=IV\.|V\.|Yêu cầu|Điều kiện|Nội dung|$)',
-            r'V\.\s*Đối tượng.*?(?=VI\.|VII\.|Điều kiện|Nội dung|$)',
-            r'Đối tượng(?:\s+tham gia|\s+học)?.*?(?=IV\.|V\.|VI\.|Yêu cầu|Điều kiện|Nội dung|$)',
-            # Special pattern for "Đối tượng học"
-            r'Đối tượng học\s*:.*?(?=IV\.|V\.|Yêu cầu|Điều kiện|Nội dung|$)'
-        ]
-        
         audience_text = ""
-        for pattern in audience_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION2_AUDIENCE_RES:
+            match = _search_section(pattern, text)
             if match:
                 audience_text = match.group().strip()
                 audience_text = re.sub(r'^(?:III\.|V\.)\s*Đối tượng.*?:\s*', '', audience_text, flags=re.IGNORECASE)
@@ -317,15 +406,9 @@ class CourseInfoExtractor:
             parts.append(f"Đối tượng tham gia:\n{audience_text}")
         
         # 3. Tìm điều kiện tiên quyết/yêu cầu (enhanced patterns)
-        prereq_patterns = [
-            r'IV\.\s*(?:Yêu cầu|Điều kiện).*?(?=V\.|VI\.|Nội dung|$)',
-            r'VI\.\s*Điều kiện.*?(?=VII\.|VIII\.|Nội dung|$)',
-            r'(?:Điều kiện tiên quyết|Yêu cầu trước khóa học).*?(?=V\.|VI\.|VII\.|Nội dung|$)'
-        ]
-        
         prereq_text = ""
-        for pattern in prereq_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION2_PREREQ_RES:
+            match = _search_section(pattern, text)
             if match:
                 prereq_text = match.group().strip()
                 prereq_text = re.sub(r'^(?:IV\.|VI\.)\s*(?:Điều kiện|Yêu cầu).*?:\s*', '', prereq_text, flags=re.IGNORECASE)
@@ -340,36 +423,21 @@ class CourseInfoExtractor:
         # Fallback nếu không tìm thấy gì
         if not result or len(result.strip()) < 50:
             # Tìm bất kỳ thông tin nào về đối tượng hoặc yêu cầu
-            fallback_patterns = [
-                r'.*?(?:Quản trị|Admin|Developer|Kỹ sư|Chuyên viên).*?(?=Nội dung|\d+\.|$)',
-                r'.*?(?:kiến thức|kinh nghiệm|yêu cầu).*?(?:Linux|cơ bản|nền tảng).*?(?=Nội dung|\d+\.|$)'
-            ]
-            
-            for pattern in fallback_patterns:
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+            for pattern in _SECTION2_FALLBACK_RES:
+                match = _search_section(pattern, text)
                 if match:
                     result = f"Đối tượng và yêu cầu:\n{match.group().strip()}"
                     break
         
         return result if result else "Thông tin mục tiêu và đối tượng khóa học."
     
-    def _extract_precise_section3(self, text: str, raw_sections: Dict[str, str]) -> str:
+    def _extract_precise_section3(self, text: str, raw_sections: RawSections) -> str:
         """Extract chính xác section 3: Nội dung khóa học - ENHANCED"""
         
         # Tìm nội dung khóa học với flexible patterns
-        content_patterns = [
-            r'V\.\s*Nội dung.*',  # Most common
-            r'VI\.\s*Nội dung.*',  # Alternative numbering
-            r'VII\.\s*Nội dung.*',  # If more sections before
-            r'Nội dung khóa học.*',
-            r'\d+\.\s*(?:Introduction|Tổng quan|Overview).*',  # First module
-            r'Module\s*1.*',  # Module-based content
-            r'Chương\s*1.*'  # Chapter-based content
-        ]
-        
         content_text = ""
-        for pattern in content_patterns:
-            match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+        for pattern in _SECTION3_CONTENT_RES:
+            match = _search_section(pattern, text)
             if match:
                 content_text = match.group().strip()
                 # Clean section header
@@ -380,16 +448,8 @@ class CourseInfoExtractor:
         # Enhanced fallback - look for structured content
         if not content_text or len(content_text.strip()) < 100:
             # Look for numbered items/modules
-            module_patterns = [
-                r'1\.\s*.*?(?:\n2\.|$)',  # Look for "1. ..." patterns
-                r'Module.*?1.*',
-                r'Introduction to.*',
-                r'Hadoop.*Installation.*',
-                r'HDFS.*Components.*'
-            ]
-            
-            for pattern in module_patterns:
-                match = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+            for pattern in _SECTION3_MODULE_RES:
+                match = _search_section(pattern, text)
                 if match:
                     # Try to capture more content after the match
                     start_pos = match.start()
@@ -483,17 +543,33 @@ class CourseInfoExtractor:
         if not text or len(text.strip()) < 100:
             return {}
         
+        # Cùng nội dung PDF -> dùng lại kết quả (FixedSections immutable nên cache an toàn)
+        return _extract_course_info_cached(EXTRACTOR_VERSION, text).to_dict()
+    
+    def _extract_fixed_sections(self, text: str) -> FixedSections:
+        """Clean text, extract raw sections rồi gộp thành 3 sections cố định"""
         # Clean text first
         cleaned_text = self.text_cleaner.clean_text(text)
         
         # Extract các sections riêng lẻ trước
-        raw_sections = {}
+        raw_contents = {}
         for section_name in self.section_configs.keys():
             content = self.extract_section_content(cleaned_text, section_name)
             if content and len(content.strip()) > 30:
-                raw_sections[section_name] = content
+                raw_contents[section_name] = content
+        raw_sections = RawSections(**raw_contents)
         
         # Tạo 3 sections cố định từ raw sections
-        final_sections = self._create_fixed_sections(raw_sections, cleaned_text)
-        
-        return final_sections
+        return self._create_fixed_sections(raw_sections, cleaned_text)
+
+
+@functools.lru_cache(maxsize=1)
+def _shared_extractor() -> CourseInfoExtractor:
+    """Extractor dùng cho cache - mọi instance có cùng section_configs nên kết quả không phụ thuộc instance"""
+    return CourseInfoExtractor()
+
+
+@functools.lru_cache(maxsize=128)
+def _extract_course_info_cached(version: int, text: str) -> FixedSections:
+    """Memoized extraction dùng chung giữa các instance, key theo (version, nội dung text)"""
+    return _shared_extractor()._extract_fixed_sections(text)
@@ -5,8 +5,7 @@ Handles PDF loading and document creation
 
 import os
 import logging
-from typing import List, Dict
-from pathlib import Path
+from typing import List, Dict, Optional
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
@@ -18,17 +17,31 @@ logger = logging.getLogger(__name__)
 class PDFLoader:
     """Load và process PDF files thành structured documents"""
     
+    _text_splitter: Optional[RecursiveCharacterTextSplitter] = None
+    
     def __init__(self):
-        self.chunk_size = int(os.getenv("CHUNK_SIZE", "800"))
-        self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "100"))
         self.extractor = CourseInfoExtractor()
-        
-        # Text splitter for fallback chunking
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-        )
+        # Text splitter for fallback chunking - dùng chung cho mọi PDFLoader
+        self.text_splitter = self.get_text_splitter()
+    
+    @classmethod
+    def get_text_splitter(cls) -> RecursiveCharacterTextSplitter:
+        """Shared text splitter, tạo một lần từ CHUNK_SIZE/CHUNK_OVERLAP ở lần dùng đầu tiên"""
+        if cls._text_splitter is None:
+            cls.chunk_size = int(os.getenv("CHUNK_SIZE", "800"))
+            cls.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "100"))
+            cls._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=cls.chunk_size,
+                chunk_overlap=cls.chunk_overlap,
+                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
+            )
+        return cls._text_splitter
+    
+    @classmethod
+    def reload_text_splitter(cls) -> RecursiveCharacterTextSplitter:
+        """Tạo lại shared text splitter sau khi thay đổi CHUNK_SIZE/CHUNK_OVERLAP"""
+        cls._text_splitter = None
+        return cls.get_text_splitter()
     
     def load_pdf_file(self, file_path: str) -> List[Document]:
         """Load single PDF file and create structured documents"""
@@ -170,12 +183,13 @@ class PDFLoader:
     
     def load_pdf_folder(self, folder_path: str) -> List[Document]:
         """Load all PDF files from a folder"""
-        folder = Path(folder_path)
-        if not folder.exists():
+        if not os.path.exists(folder_path):
             logger.error(f"Folder {folder_path} does not exist")
             return []
         
-        pdf_files = list(folder.glob("*.pdf"))
+        # scandir trả về DirEntry (đã có name/type), không tạo Path + fnmatch cho từng entry
+        with os.scandir(folder_path) as entries:
+            pdf_files = [e.path for e in entries if e.is_file() and e.name.lower().endswith('.pdf')]
         if not pdf_files:
             logger.warning(f"No PDF files found in {folder_path}")
             return []
@@ -184,8 +198,20 @@ class PDFLoader:
         
         all_documents = []
         for pdf_file in pdf_files:
-            documents = self.load_pdf_file(str(pdf_file))
+            documents = self.load_pdf_file(pdf_file)
             all_documents.extend(documents)
         
         logger.info(f"Total loaded: {len(all_documents)} documents from {len(pdf_files)} PDF files")
         return all_documents
+
+
+# PDFLoader riêng của mỗi worker process (tạo lazy, tái dùng giữa các file)
+_worker_loader: Optional[PDFLoader] = None
+
+
+def load_pdf_worker(file_path: str) -> List[Document]:
+    """Entry point cho ProcessPoolExecutor - bound method của PDFLoader không pickle được"""
+    global _worker_loader
+    if _worker_loader is None:
+        _worker_loader = PDFLoader()
+    return _worker_loader.load_pdf_file(file_path)
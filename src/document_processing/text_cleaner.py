@@ -264,3 +264,13 @@ class TextCleaner:
         text = self.remove_incomplete_lines(text)
         
         return text.strip()
+    
+    def clean_text_range(self, text: str, start: int, end: int) -> str:
+        """Clean text[start:end], chỉ tạo slice khi range không phủ toàn bộ text"""
+        if start >= end:
+            return ""
+        
+        if start == 0 and end >= len(text):
+            return self.clean_text(text)
+        
+        return self.clean_text(text[start:end])
@@ -4,34 +4,42 @@ Phân loại intent và route đến handler phù hợp dựa trên bảng inten
 """
 
 import os
+import re
 import sys
-from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import functools
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, List, Optional
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+try:
+    import ahocorasick  # pyahocorasick - optional, fallback quét substring
+except ImportError:
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.append(current_dir)
 
 try:
-    from llm_models import llm_manager
+    from llm_models import get_llm_manager
     from sheets_logger import log_simple_chat
     from policy_tools import search_promotion_info, search_policy_info
     from course_matcher import course_matcher
     from topic_vectordb import search_course_db
 except ImportError as e:
-    print(f"Import error in routing_chain.py: {e}")
-    # Fallback imports
-    llm_manager = None
-    log_simple_chat = None
-    search_promotion_info = None
-    search_policy_info = None
-    course_matcher = None
-    search_course_db = None
-    search_promotion_info = None
-    search_policy_info = None
-    course_matcher = None
+    logger.debug("Import error in routing_chain.py: %s", e)
+
+# Dependency nào không import được thì là None (classifier/handler báo ImportError khi khởi tạo)
+for _name in ("get_llm_manager", "log_simple_chat", "search_promotion_info",
+              "search_policy_info", "course_matcher", "search_course_db"):
+    globals().setdefault(_name, None)
 
 # Intent definitions từ bảng company với hardcode schedule và fixed rules
 INTENTS_CONFIG = {
@@ -127,17 +135,193 @@ INTENTS_CONFIG = {
     }
 }
 
+# Keywords (lowercase) của từng intent, tính một lần khi import
+INTENT_KEYWORDS = {
+    intent_id: frozenset(keyword.lower() for keyword in config["keywords"])
+    for intent_id, config in INTENTS_CONFIG.items()
+}
+
+@functools.lru_cache(maxsize=256)
+def normalize_input(user_input: str) -> str:
+    """NFC + lowercase, tính một lần cho mỗi message rồi dùng lại ở classifier và các handler
+    (input dạng NFD từ một số bộ gõ sẽ không khớp keywords tiếng Việt nếu không chuẩn hóa)"""
+    return unicodedata.normalize("NFC", user_input).lower()
+
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    """text[start:end] không dính liền chữ/số ở hai đầu"""
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+class KeywordMatcher:
+    """Tìm tập keywords trong text bằng một lượt Aho-Corasick (fallback: regex union) thay vì K lần `in`"""
+    
+    def __init__(self, keywords: List[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+        self._automaton = None
+        self._pattern = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+        elif self.keywords:
+            # Lookahead ở mọi vị trí, alternation dài trước -> mỗi vị trí lấy keyword dài nhất bắt đầu tại đó;
+            # các keyword ngắn hơn cùng vị trí là prefix của nó (self._prefixes) nên không bị sót
+            longest_first = sorted(self.keywords, key=len, reverse=True)
+            self._pattern = re.compile("(?=(" + "|".join(map(re.escape, longest_first)) + "))")
+            self._prefixes = {
+                keyword: [other for other in self.keywords if keyword.startswith(other)]
+                for keyword in self.keywords
+            }
+    
+    def _iter_matches(self, text: str):
+        """(start, keyword) cho mọi keyword xuất hiện trong text"""
+        if self._automaton is not None:
+            for end, keyword in self._automaton.iter(text):
+                yield end - len(keyword) + 1, keyword
+        elif self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                start = match.start()
+                for keyword in self._prefixes[match.group(1)]:
+                    yield start, keyword
+    
+    def find(self, text: str) -> set:
+        """Các keywords (không trùng lặp) xuất hiện trong text"""
+        return {keyword for _, keyword in self._iter_matches(text)}
+    
+    def find_words(self, text: str) -> set:
+        """Như find() nhưng chỉ lấy keyword đứng thành từ riêng ("giá" không khớp trong "giáo")"""
+        return {
+            keyword for start, keyword in self._iter_matches(text)
+            if _is_whole_word(text, start, start + len(keyword))
+        }
+    
+    def count(self, text: str) -> int:
+        return len(self.find(text))
+    
+    def contains_any(self, text: str) -> bool:
+        return next(self._iter_matches(text), None) is not None
+
+# Các keywords chỉ ra user đã cung cấp thông tin về background
+BACKGROUND_INDICATORS = [
+    # Trình độ/Kinh nghiệm
+    "sinh viên", "năm cuối", "năm", "developer", "senior", "junior", "fresher", 
+    "newbie", "mới vào nghề", "mới học", "đang làm", "làm việc",
+    
+    # Vị trí công việc
+    "system admin", "devops", "it support", "qa tester", "business analyst",
+    "project manager", "team lead", "tech lead", "data engineer", "frontend", "backend",
+    
+    # Kiến thức nền tảng
+    "đã học", "đã có kiến thức", "biết về", "có nền tảng", "html", "css", "java", "python",
+    
+    # Mục tiêu rõ ràng
+    "muốn học xong", "để đi làm", "với role", "mục tiêu", "định hướng", "career",
+    "lấy chứng chỉ", "nâng cao kỹ năng", "thăng tiến", "chuyển nghề",
+    
+    # Ngân sách cụ thể
+    "triệu", "budget", "chi phí", "khoảng",
+    
+    # Thời gian cụ thể
+    "ngày/tuần", "buổi/tuần", "cuối tuần", "tối", "sáng", "part time", "full time"
+]
+
+# Keywords cho câu hỏi về khóa học cụ thể trong tech_consultation
+COURSE_SPECIFIC_KEYWORDS = [
+    "khóa học", "chứng chỉ", "lộ trình học", "đào tạo", "học tập",
+    "aws certification", "azure certification", "vmware certification",
+    "devops course", "ai course", "machine learning course"
+]
+
+# Automaton build một lần khi import, dùng chung cho mọi request. Việc scan đã chạy trong C
+# (pyahocorasick / re) và chỉ vài micro-giây so với LLM call, nên không cần Numba/Cython ở đây
+BACKGROUND_MATCHER = KeywordMatcher(BACKGROUND_INDICATORS)
+COURSE_SPECIFIC_MATCHER = KeywordMatcher(COURSE_SPECIFIC_KEYWORDS)
+
+# Local classifier: keyword -> intents chứa keyword đó
+KEYWORD_INTENTS: Dict[str, List[str]] = {}
+for _intent_id, _keywords in INTENT_KEYWORDS.items():
+    for _keyword in _keywords:
+        KEYWORD_INTENTS.setdefault(_keyword, []).append(_intent_id)
+INTENT_MATCHER = KeywordMatcher(list(KEYWORD_INTENTS))
+
+# Keywords đủ chắc chắn để bỏ qua LLM - chỉ dùng khi đây là intent DUY NHẤT có keyword khớp.
+# Intent rộng (course_consultation, tech_consultation, training_for_company) luôn để LLM phân xử
+LOCAL_INTENT_KEYWORDS = {
+    "general_inquiry": frozenset(["hello", "hi", "chào"]),
+    "promotion_inquiry": frozenset(["ưu đãi", "khuyến mãi", "giảm giá", "promotion", "discount", "voucher"]),
+    "company_info": frozenset(["robusta"]),
+    "policy_inquiry": frozenset(["chính sách", "học vụ", "điều kiện", "chứng chỉ", "bao đậu", "trả góp", "e-learning", "cccd"]),
+    "schedule_inquiry": frozenset(["khai giảng", "lịch học"]),
+    "course_inquiry": frozenset(["học phí"]),
+}
+
+# Ví dụ phân loại dùng trong prompt LLM, đồng thời là bộ kiểm tra cho local classifier
+INTENT_EXAMPLES = [
+    ("Học phí AWS bao nhiêu?", "course_inquiry"),
+    ("Tôi muốn học về cloud computing", "course_consultation"),
+    ("Khóa AI khi nào khai giảng?", "schedule_inquiry"),
+    ("Có ưu đãi gì cho sinh viên không?", "promotion_inquiry"),
+    ("AI và Machine Learning khác nhau thế nào?", "tech_consultation"),
+    ("Robusta Training có bao nhiều năm kinh nghiệm?", "company_info"),
+    ("Công ty tôi muốn đào tạo 50 nhân viên về DevOps", "training_for_company"),
+    ("Điều kiện để nhận chứng chỉ là gì?", "policy_inquiry"),
+    ("Hôm nay thời tiết thế nào?", "general_inquiry"),
+]
+# Thêm các câu từng bị phân loại sai khi chấm điểm theo độ dài keyword
+LOCAL_CLASSIFIER_CHECKS = INTENT_EXAMPLES + [
+    ("Giá khóa học AWS?", "course_inquiry"),
+    ("Yêu cầu đầu vào của khóa AWS là gì", "course_consultation"),
+    ("hi", "general_inquiry"),
+    ("Xin chào", "general_inquiry"),
+]
+
+# Opt-in: bật bằng LOCAL_INTENT_CLASSIFIER=1
+LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_INTENT_CLASSIFIER", "0") == "1"
+LOCAL_CLASSIFIER_DEBUG = os.getenv("LOCAL_INTENT_DEBUG", "0") == "1"  # log quyết định để tune keywords
+
+def classify_by_keywords(user_input: str) -> Optional[str]:
+    """Intent khi chỉ đúng một intent có keyword khớp và trong đó có keyword chắc chắn, None nếu cần LLM"""
+    matched = INTENT_MATCHER.find_words(normalize_input(user_input))
+    intents = {intent_id for keyword in matched for intent_id in KEYWORD_INTENTS[keyword]}
+    if len(intents) != 1:
+        return None
+    intent = intents.pop()
+    return intent if matched & LOCAL_INTENT_KEYWORDS.get(intent, frozenset()) else None
+
+def check_local_classifier() -> List[str]:
+    """Các câu trong LOCAL_CLASSIFIER_CHECKS bị local classifier trả intent sai (None = để LLM thì không tính là sai)"""
+    return [
+        f"{text!r}: {intent} != {expected}"
+        for text, expected in LOCAL_CLASSIFIER_CHECKS
+        if (intent := classify_by_keywords(text)) is not None and intent != expected
+    ]
+
+if LOCAL_CLASSIFIER_ENABLED:
+    _local_errors = check_local_classifier()
+    if _local_errors:
+        logger.warning("Local intent classifier disabled, wrong on examples: %s", "; ".join(_local_errors))
+        LOCAL_CLASSIFIER_ENABLED = False
+
+# Số câu (đã normalize) giữ kết quả phân loại LLM trong process - tin nhắn lặp lại không gọi LLM lần nữa
+CLASSIFY_CACHE_SIZE = 4096
+# Câu trả lời general_inquiry không phụ thuộc session nên cũng cache theo câu đã normalize (chỉ lưu answer)
+GENERAL_CACHE_SIZE = 1024
+
 class IntentClassifier:
     """Phân loại intent từ user input"""
     
     def __init__(self):
-        if llm_manager is None:
+        if get_llm_manager is None:
             raise ImportError("llm_manager not available")
-        self.llm = llm_manager.get_llm()
+        self.llm_manager = get_llm_manager()
+        self.llm = self.llm_manager.get_llm()
         self.intent_prompt = self._create_intent_prompt()
+        self.chain = self.intent_prompt | self.llm | StrOutputParser()
+        self._intent_cache: "OrderedDict[str, str]" = OrderedDict()
     
     def _create_intent_prompt(self) -> ChatPromptTemplate:
-        """Tạo prompt để phân loại intent"""
+        """Tạo prompt để phân loại intent - phần tĩnh ở system message làm prefix cố định để provider cache"""
         
         intent_descriptions = []
         for intent_id, config in INTENTS_CONFIG.items():
@@ -145,8 +329,9 @@ class IntentClassifier:
             intent_descriptions.append(f"- {intent_id}: {config['name']} (keywords: {keywords})")
         
         intent_list = "\n".join(intent_descriptions)
+        examples = "\n".join(f'- "{text}" → {intent_id}' for text, intent_id in INTENT_EXAMPLES)
         
-        return ChatPromptTemplate.from_template("""
+        system_text = """
 Bạn là AI classifier cho chatbot Robusta Training. Nhiệm vụ: phân loại intent của user.
 
 DANH SÁCH INTENT:
@@ -160,89 +345,359 @@ NGUYÊN TẮC PHÂN LOẠI:
 5. Chỉ chọn general_inquiry khi thực sự ngoài phạm vi
 
 EXAMPLES:
-- "Học phí AWS bao nhiêu?" → course_inquiry
-- "Tôi muốn học về cloud computing" → course_consultation  
-- "Khóa AI khi nào khai giảng?" → schedule_inquiry
-- "Có ưu đãi gì cho sinh viên không?" → promotion_inquiry
-- "AI và Machine Learning khác nhau thế nào?" → tech_consultation
-- "Robusta Training có bao nhiều năm kinh nghiệm?" → company_info
-- "Công ty tôi muốn đào tạo 50 nhân viên về DevOps" → training_for_company
-- "Điều kiện để nhận chứng chỉ là gì?" → policy_inquiry
-- "Hôm nay thời tiết thế nào?" → general_inquiry
-
-USER INPUT: {user_input}
-
-HÃY PHÂN TÍCH VÀ CHỈ TRẢ VỀ INTENT ID DUY NHẤT (ví dụ: course_inquiry):
-""".strip()).partial(intent_list=intent_list)
+{examples}
+""".strip().replace("{intent_list}", intent_list).replace("{examples}", examples)
+        
+        # Chỉ phần user input thay đổi giữa các request
+        return ChatPromptTemplate.from_messages([
+            self.llm_manager.system_message(system_text),
+            ("human", "USER INPUT: {user_input}\n\nHÃY PHÂN TÍCH VÀ CHỈ TRẢ VỀ INTENT ID DUY NHẤT (ví dụ: course_inquiry):")
+        ])
+    
+    def _parse_intent(self, result: str) -> str:
+        """Clean kết quả LLM và validate intent exists"""
+        intent = result.strip().lower()
+        return intent if intent in INTENTS_CONFIG else "general_inquiry"
+    
+    def classify_local(self, user_input: str) -> Optional[str]:
+        """Phân loại bằng keywords cho case rõ ràng, None nếu cần LLM phân xử"""
+        if not LOCAL_CLASSIFIER_ENABLED:
+            return None
+        
+        intent = classify_by_keywords(user_input)
+        if LOCAL_CLASSIFIER_DEBUG:
+            logger.info("Local intent: %r -> %s", user_input, intent or "LLM")
+        return intent
+    
+    def _classify_without_llm(self, user_input: str) -> Optional[str]:
+        """Intent từ local classifier hoặc từ cache kết quả LLM trước đó, None nếu phải gọi LLM"""
+        intent = self.classify_local(user_input)
+        if intent:
+            return intent
+        key = normalize_input(user_input).strip()
+        try:
+            self._intent_cache.move_to_end(key)
+            return self._intent_cache[key]
+        except KeyError:
+            return None
+    
+    def _remember(self, user_input: str, intent: str) -> None:
+        self._intent_cache[normalize_input(user_input).strip()] = intent
+        while len(self._intent_cache) > CLASSIFY_CACHE_SIZE:
+            self._intent_cache.popitem(last=False)
     
     def classify(self, user_input: str) -> str:
         """Phân loại intent của user input"""
+        intent = self._classify_without_llm(user_input)
+        if intent:
+            return intent
         try:
-            chain = self.intent_prompt | self.llm | StrOutputParser()
-            result = chain.invoke({"user_input": user_input})
-            
-            # Clean result
-            intent = result.strip().lower()
-            
-            # Validate intent exists
-            if intent in INTENTS_CONFIG:
-                return intent
-            else:
-                return "general_inquiry"
-                
-        except Exception as e:
-            print(f"Error classifying intent: {e}")
+            result = self.chain.invoke({"user_input": user_input})
+            intent = self._parse_intent(result)
+            self._remember(user_input, intent)
+            return intent
+        except Exception:
+            logger.exception("Error classifying intent")
+            return "general_inquiry"
+    
+    async def aclassify(self, user_input: str) -> str:
+        """Async version của classify - không block event loop khi chờ LLM"""
+        intent = self._classify_without_llm(user_input)
+        if intent:
+            return intent
+        try:
+            result = await self.chain.ainvoke({"user_input": user_input})
+            intent = self._parse_intent(result)
+            self._remember(user_input, intent)
+            return intent
+        except Exception:
+            logger.exception("Error classifying intent")
             return "general_inquiry"
+    
+    async def abatch_classify(self, user_inputs: List[str], max_concurrency: int = 10) -> List[str]:
+        """Phân loại nhiều inputs song song (tối đa max_concurrency request LLM cùng lúc)"""
+        intents = [self._classify_without_llm(user_input) for user_input in user_inputs]
+        pending = [i for i, intent in enumerate(intents) if intent is None]
+        if pending:
+            results = await self.chain.abatch(
+                [{"user_input": user_inputs[i]} for i in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True
+            )
+            for i, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    intents[i] = "general_inquiry"
+                else:
+                    intents[i] = self._parse_intent(result)
+                    self._remember(user_inputs[i], intents[i])
+        return intents
+
+# Prompt templates cho các handler dùng LLM (f-string, parse một lần trong IntentHandler.__init__).
+# User input / dữ liệu RAG luôn truyền qua biến nên "{...}" trong input không gây KeyError;
+# chỉ ngoặc nhọn viết trực tiếp trong template mới cần escape thành {{ }}.
+PERSONALIZATION_TEMPLATE = """
+Bạn là tư vấn viên Robusta Training. Dựa trên thông tin khách hàng và database, tư vấn NGẮN GỌN.
+
+KHÁCH HÀNG: {user_input}
+
+KHÓA HỌC PHÙHỢP: {rag_results}
+
+TƯ VẤN NGẮN GỌN (2-3 câu):
+- Phân tích nhu cầu của khách
+- Recommend 1-2 khóa học phù hợp nhất
+- Mời để lại thông tin tư vấn chi tiết
+
+TONE: Thân thiện, không dài dòng.
+"""
+
+SCHEDULE_TEMPLATE = """
+Bạn là tư vấn viên Robusta Training. Khách hỏi lịch khai giảng, trả lời NGẮN GỌN.
+
+LỊCH KHAI GIẢNG {course_type}:
+{course_list}
+
+CÂU HỎI: {user_input}
+
+TRẢ LỜI NGẮN GỌN:
+- Hiển thị 1-2 khóa phù hợp nhất
+- Mời để lại thông tin để cập nhật lịch mới nhất
+
+TONE: Thân thiện, tự nhiên.
+"""
+
+PROMOTION_TEMPLATE = """
+Bạn là tư vấn viên Robusta Training. Khách hỏi về ưu đãi, trả lời NGẮN GỌN, TRỰC TIẾP.
+
+THÔNG TIN ƯU ĐÃI TỪ DATABASE:
+{promotion_data}
+
+CÂU HỎI KHÁCH HÀNG: {user_input}
+
+HƯỚNG DẪN TRẢ LỜI:
+- Trả lời ngắn gọn (2-3 câu) dựa trên thông tin database
+- Tập trung vào ưu đãi phù hợp với câu hỏi
+- Kết thúc bằng mời để lại thông tin để tư vấn
+
+TONE: Thân thiện, tự nhiên.
+"""
+
+POLICY_TEMPLATE = """
+Bạn là tư vấn viên Robusta Training. Khách hỏi về chính sách học vụ, trả lời NGẮN GỌN, CHÍNH XÁC.
+
+THÔNG TIN CHÍNH SÁCH TỪ DATABASE:
+{policy_data}
+
+CÂU HỎI KHÁCH HÀNG: {user_input}
+
+HƯỚNG DẪN TRẢ LỜI:
+- Trả lời ngắn gọn (1-2 câu) dựa trên thông tin database
+- Tập trung vào chính xác câu hỏi được hỏi
+- Kết thúc bằng mời để lại thông tin nếu cần hỗ trợ thêm
+
+TONE: Chuyên nghiệp, chính xác.
+"""
+
+# General inquiry: phần tĩnh (profile Robusta + hướng dẫn) đứng trước làm prefix cache, câu hỏi đứng cuối
+GENERAL_SYSTEM = """
+Bạn là tư vấn viên Robusta Training. Trả lời NGẮN GỌN về các câu hỏi tổng quát.
+
+THÔNG TIN ROBUSTA:
+• Trung tâm đào tạo công nghệ hàng đầu
+• Chuyên: Cloud Computing, DevOps, Container, Kubernetes, CI/CD
+• Giảng viên giàu kinh nghiệm từ các công ty lớn
+• Học thực hành, dự án thực tế, hỗ trợ việc làm
+• Địa điểm: Hà Nội và TP.HCM
+• Hình thức: Offline và Online
+
+TRẢ LỜI NGẮN GỌN (1-2 câu):
+- Trả lời trực tiếp câu hỏi
+- Mời tư vấn thêm nếu cần
+
+TONE: Thân thiện, tự nhiên.
+""".strip()
+
+GENERAL_TEMPLATE = "CÂU HỎI: {user_input}"
+
+# Lịch khai giảng dạng cột (SoA) + index family -> rows, build một lần từ hardcode_schedule
+SCHEDULE: Dict[str, List[str]] = {"courses": [], "dates": [], "times": [], "durations": [], "family": []}
+FAMILY_INDEX: Dict[str, List[int]] = {}
+for _family, _rows in INTENTS_CONFIG["schedule_inquiry"]["hardcode_schedule"].items():
+    for _row in _rows:
+        FAMILY_INDEX.setdefault(_family, []).append(len(SCHEDULE["courses"]))
+        SCHEDULE["courses"].append(_row["course"])
+        SCHEDULE["dates"].append(_row["date"])
+        SCHEDULE["times"].append(_row["time"])
+        SCHEDULE["durations"].append(_row["duration"])
+        SCHEDULE["family"].append(_family)
+FAMILY_INDEX["Tất cả"] = list(range(len(SCHEDULE["courses"])))
+
+# Keywords nhận diện family, theo thứ tự ưu tiên
+SCHEDULE_FAMILY_KEYWORDS = [("VMware", ("vmware", "vsphere")), ("Cloud", ("aws", "cloud"))]
+
+# Top 3 khóa của mỗi family, format sẵn cho prompt
+SCHEDULE_COURSE_LISTS = {
+    family: "".join(
+        f"• {SCHEDULE['courses'][i]} - {SCHEDULE['dates'][i]} ({SCHEDULE['times'][i]})\n" for i in rows[:3]
+    )
+    for family, rows in FAMILY_INDEX.items()
+}
+
+# Câu trả lời tĩnh - build một lần, handler trả về bản copy (RoutingChain sẽ update metadata)
+QUALIFICATION_QUESTIONS = """🎯 Để tư vấn khóa học phù hợp, bạn vui lòng chia sẻ:
+
+1. Lĩnh vực làm việc hiện tại:
+   • Developer, IT Support, System Admin, Student, Business Analyst...
+
+2. Kỹ năng và kinh nghiệm:
+   • Những công nghệ/tools đã biết (VD: Python, AWS, Linux...)
+   • Số năm kinh nghiệm trong IT
+
+3. Mục tiêu sau khóa học:
+   • Chuyển đổi nghề nghiệp, thăng tiến, lấy chứng chỉ, nâng cao kỹ năng...
+
+💡 Với thông tin này, mình sẽ tư vấn khóa học cụ thể và phù hợp nhất!"""
+
+B2B_QUESTIONS = """🏢 **Để tư vấn gói đào tạo doanh nghiệp tốt nhất, vui lòng cung cấp thông tin:**
+
+• **Quy mô:** Số lượng nhân viên cần đào tạo?
+• **Vị trí:** Nhân viên đang làm việc ở vị trí nào? (Dev, IT, Manager...)
+• **Nội dung:** Muốn đào tạo về lĩnh vực gì? (Cloud, AI, DevOps, Security...)
+• **Thời gian:** Dự kiến thời gian đào tạo? (1 tuần, 1 tháng, 3 tháng...)
+• **Hình thức:** Ưu tiên hình thức nào? (Onsite, Online, Hybrid)
+• **Mục tiêu:** Mục tiêu cụ thể sau đào tạo? (Lấy chứng chỉ, nâng cao kỹ năng, áp dụng vào dự án...)
+
+💼 **Robusta có kinh nghiệm đào tạo cho 300+ doanh nghiệp với các gói ưu đãi đặc biệt cho B2B!**
+
+📞 **Bạn có muốn để lại thông tin liên hệ để nhận tư vấn chi tiết từ team B2B không?**"""
+
+TECH_REDIRECT_ANSWER = """🎯 **Để tư vấn khóa học phù hợp nhất, mình cần chuyển sang chế độ tư vấn chuyên sâu.**
+
+Bạn vui lòng hỏi lại câu hỏi dưới dạng: "Tôi muốn được tư vấn khóa học về [lĩnh vực]"
+
+Ví dụ:
+• "Tôi muốn được tư vấn khóa học về AWS"
+• "Tư vấn lộ trình học DevOps cho mình"
+• "Khóa học AI nào phù hợp với người mới bắt đầu?"
+
+💡 **Như vậy mình sẽ thu thập thông tin của bạn để tư vấn chính xác nhất!**"""
+
+TECH_GUIDANCE_ANSWER = """🚀 **Xu hướng công nghệ 2025 và định hướng phát triển:**
+
+• **AI/Generative AI:** Cách mạng hóa mọi ngành - ChatGPT, Copilot, AI Integration
+• **Cloud-First Strategy:** Multi-cloud, Hybrid cloud là bắt buộc
+• **DevSecOps:** Tích hợp Security vào toàn bộ development lifecycle  
+• **Edge Computing:** Xử lý dữ liệu gần user, giảm latency
+• **Quantum Computing:** Công nghệ đột phá cho tương lai gần
+
+💼 **Kỹ năng HOT nhất hiện tại:**
+• **Cloud Architects:** AWS, Azure, GCP
+• **AI Engineers:** Machine Learning, Deep Learning
+• **DevOps Engineers:** Kubernetes, Docker, CI/CD
+• **Cybersecurity Specialists:** Zero Trust, Cloud Security
+• **Data Engineers:** Big Data, Analytics, Data Pipeline
+
+🎯 **Lộ trình phát triển sự nghiệp:**
+1. **Xác định specialization** - Chọn 1-2 lĩnh vực chuyên sâu
+2. **Hands-on practice** - Project thực tế, not just theory
+3. **Certification** - Chứng chỉ uy tín (AWS, Azure, CISSP...)
+4. **Community** - Network với professionals cùng lĩnh vực
+
+📚 **Muốn biết khóa học cụ thể? Hãy hỏi: "Tư vấn khóa học về [lĩnh vực]"**"""
+
+COURSE_INQUIRY_RESPONSE = {
+    "intent": "course_inquiry",
+    "answer": INTENTS_CONFIG["course_inquiry"]["reply_template"],
+    "action": INTENTS_CONFIG["course_inquiry"]["action"],
+    "next_step": "collect_contact",
+    "sources": []
+}
+
+FALLBACK_CONSULTATION_RESPONSE = {
+    "intent": "course_consultation",
+    "answer": QUALIFICATION_QUESTIONS,
+    "action": INTENTS_CONFIG["course_consultation"]["action"],
+    "next_step": "await_qualification",
+    "sources": [],
+    "needs_qualification": True
+}
+
+COMPANY_INFO_RESPONSE = {
+    "intent": "company_info",
+    "answer": INTENTS_CONFIG["company_info"]["reply_template"],
+    "action": INTENTS_CONFIG["company_info"]["action"],
+    "next_step": "collect_contact",
+    "sources": []
+}
+
+TRAINING_FOR_COMPANY_RESPONSE = {
+    "intent": "training_for_company",
+    "answer": B2B_QUESTIONS,
+    "action": INTENTS_CONFIG["training_for_company"]["action"],
+    "next_step": "collect_company_info",
+    "sources": [],
+    "needs_qualification": True
+}
+
+TECH_REDIRECT_RESPONSE = {
+    "intent": "tech_consultation",
+    "answer": TECH_REDIRECT_ANSWER,
+    "action": INTENTS_CONFIG["tech_consultation"]["action"],
+    "next_step": "redirect_to_course_consultation",
+    "sources": [],
+    "redirect": "course_consultation"
+}
+
+TECH_GUIDANCE_RESPONSE = {
+    "intent": "tech_consultation",
+    "answer": TECH_GUIDANCE_ANSWER,
+    "action": INTENTS_CONFIG["tech_consultation"]["action"],
+    "next_step": "tech_follow_up",
+    "sources": [],
+    "used_rag": False
+}
 
 class IntentHandler:
     """Handle các intent cụ thể"""
     
     def __init__(self):
-        if llm_manager is None or search_course_db is None:
+        if get_llm_manager is None or search_course_db is None:
             raise ImportError("Required modules not available")
+        llm_manager = get_llm_manager()
         self.llm = llm_manager.get_llm()
+        
+        # Parse template và build chain một lần, dùng lại cho mọi request
+        parser = StrOutputParser()
+        self.chains = {
+            "personalization": ChatPromptTemplate.from_template(PERSONALIZATION_TEMPLATE) | self.llm | parser,
+            "schedule": ChatPromptTemplate.from_template(SCHEDULE_TEMPLATE) | self.llm | parser,
+            "promotion": ChatPromptTemplate.from_template(PROMOTION_TEMPLATE) | self.llm | parser,
+            "policy": ChatPromptTemplate.from_template(POLICY_TEMPLATE) | self.llm | parser,
+            "general": ChatPromptTemplate.from_messages([
+                llm_manager.system_message(GENERAL_SYSTEM),
+                ("human", GENERAL_TEMPLATE)
+            ]) | self.llm | parser
+        }
+        self._general_cache: "OrderedDict[str, str]" = OrderedDict()
     
     def _check_qualification_info(self, user_input: str) -> bool:
         """Kiểm tra xem user đã cung cấp đủ thông tin qualification chưa"""
-        user_text = user_input.lower()
+        user_text = normalize_input(user_input)
         
-        # Các keywords chỉ ra user đã cung cấp thông tin về background
-        background_indicators = [
-            # Trình độ/Kinh nghiệm
-            "sinh viên", "năm cuối", "năm", "developer", "senior", "junior", "fresher", 
-            "newbie", "mới vào nghề", "mới học", "đang làm", "làm việc",
-            
-            # Vị trí công việc
-            "system admin", "devops", "it support", "qa tester", "business analyst",
-            "project manager", "team lead", "tech lead", "data engineer", "frontend", "backend",
-            
-            # Kiến thức nền tảng
-            "đã học", "đã có kiến thức", "biết về", "có nền tảng", "html", "css", "java", "python",
-            
-            # Mục tiêu rõ ràng
-            "muốn học xong", "để đi làm", "với role", "mục tiêu", "định hướng", "career",
-            "lấy chứng chỉ", "nâng cao kỹ năng", "thăng tiến", "chuyển nghề",
-            
-            # Ngân sách cụ thể
-            "triệu", "budget", "chi phí", "khoảng",
-            
-            # Thời gian cụ thể
-            "ngày/tuần", "buổi/tuần", "cuối tuần", "tối", "sáng", "part time", "full time"
-        ]
-        
-        # Đếm số lượng indicators
-        indicator_count = sum(1 for indicator in background_indicators if indicator in user_text)
+        # Đếm số lượng indicators (mỗi indicator tính một lần)
+        indicator_count = BACKGROUND_MATCHER.count(user_text)
         
         # Nếu có ít nhất 3 indicators hoặc input dài (>80 chars) thì coi như có qualification
         has_info = indicator_count >= 3 or len(user_input) > 80
         
-        print(f"Qualification check: '{user_input}' -> {indicator_count} indicators, {len(user_input)} chars -> {has_info}")
+        logger.debug("Qualification check: %r -> %d indicators, %d chars -> %s",
+                     user_input, indicator_count, len(user_input), has_info)
         return has_info
     
     def _process_qualified_consultation(self, user_input: str, session_id: str, config: dict) -> Dict[str, Any]:
         """Xử lý consultation khi đã có qualification - Query RAG và dùng LLM để format"""
         try:
-            # Query RAG để lấy thông tin khóa học
+            # Query RAG để lấy thông tin khóa học. RAG -> LLM chạy tuần tự vì prompt personalization
+            # cần rag_results; nhánh fallback là template tĩnh nên không có LLM call nào để chạy song song
             rag_results = self._query_rag_for_consultation(user_input, session_id)
             
             if not rag_results:
@@ -269,7 +724,7 @@ class IntentHandler:
             }
             
         except Exception as e:
-            print(f"Error in qualified consultation: {e}")
+            logger.exception("Error in qualified consultation")
             return {
                 "intent": "course_consultation",
                 "answer": config["reply_template"],
@@ -282,44 +737,18 @@ class IntentHandler:
     def _generate_personalized_response(self, user_input: str, rag_results: str) -> str:
         """Dùng LLM để tạo câu trả lời cá nhân hóa từ RAG results"""
         try:
-            personalization_prompt = ChatPromptTemplate.from_template("""
-Bạn là tư vấn viên Robusta Training. Dựa trên thông tin khách hàng và database, tư vấn NGẮN GỌN.
-
-KHÁCH HÀNG: {user_input}
-
-KHÓA HỌC PHÙHỢP: {rag_results}
-
-TƯ VẤN NGẮN GỌN (2-3 câu):
-- Phân tích nhu cầu của khách
-- Recommend 1-2 khóa học phù hợp nhất
-- Mời để lại thông tin tư vấn chi tiết
-
-TONE: Thân thiện, không dài dòng.
-""")
-            
-            chain = personalization_prompt | self.llm | StrOutputParser()
-            result = chain.invoke({
+            result = self.chains["personalization"].invoke({
                 "user_input": user_input,
                 "rag_results": rag_results
             })
             
             return result.strip()
             
-        except Exception as e:
-            print(f"Error generating personalized response: {e}")
+        except Exception:
+            logger.exception("Error generating personalized response")
             # Fallback: trả về RAG results trực tiếp
             return rag_results
     
-    def _check_if_qualified(self, user_input: str) -> bool:
-        """Kiểm tra xem user đã cung cấp đủ thông tin qualification chưa"""
-        user_text = user_input.lower()
-        qualification_indicators = [
-            "năm kinh nghiệm", "đang làm", "mục tiêu", "muốn đạt", 
-            "developer", "system admin", "sinh viên", "học", "chuyển nghề",
-            "ngân sách", "thời gian", "tuần", "tháng"
-        ]
-        return any(indicator in user_text for indicator in qualification_indicators)
-    
     def _query_rag_for_consultation(self, user_input: str, session_id: str) -> str:
         """Query RAG để lấy thông tin khóa học cụ thể sau khi đã qualification"""
         try:
@@ -334,26 +763,19 @@ TONE: Thân thiện, không dài dòng.
                 if course_info and len(course_info) > 50:
                     return course_info
                 else:
-                    print(f"Search returned insufficient data: {course_info}")
+                    logger.debug("Search returned insufficient data: %r", course_info)
                     return None
             else:
-                print("No search results found")
+                logger.debug("No search results found")
                 return None
                 
-        except Exception as e:
-            print(f"Course search error: {e}")
+        except Exception:
+            logger.exception("Course search error")
             return None
     
     def handle_course_inquiry(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle thông tin học phí - Template reply mẫu"""
-        config = INTENTS_CONFIG["course_inquiry"]
-        return {
-            "intent": "course_inquiry",
-            "answer": config["reply_template"],
-            "action": config["action"],
-            "next_step": "collect_contact",
-            "sources": []
-        }
+        return dict(COURSE_INQUIRY_RESPONSE)
     
     def handle_course_consultation(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle tư vấn khóa học - Sử dụng course matcher mới"""
@@ -388,85 +810,39 @@ TONE: Thân thiện, không dài dòng.
                 "needs_qualification": needs_qualification,
                 "user_profile": {
                     "work_field": user_profile.work_field,
-                    "skills": user_profile.current_skills,
+                    "skills": list(user_profile.current_skills),
                     "goal": user_profile.goal,
                     "experience": user_profile.experience_level
                 }
             }
             
-        except Exception as e:
-            print(f"Error in course consultation: {e}")
+        except Exception:
+            logger.exception("Error in course consultation")
             return self._fallback_course_consultation(user_input, config)
     
     def _fallback_course_consultation(self, user_input: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Fallback method cho course consultation"""
-        qualification_questions = """🎯 Để tư vấn khóa học phù hợp, bạn vui lòng chia sẻ:
-
-1. Lĩnh vực làm việc hiện tại:
-   • Developer, IT Support, System Admin, Student, Business Analyst...
-
-2. Kỹ năng và kinh nghiệm:
-   • Những công nghệ/tools đã biết (VD: Python, AWS, Linux...)
-   • Số năm kinh nghiệm trong IT
-
-3. Mục tiêu sau khóa học:
-   • Chuyển đổi nghề nghiệp, thăng tiến, lấy chứng chỉ, nâng cao kỹ năng...
-
-💡 Với thông tin này, mình sẽ tư vấn khóa học cụ thể và phù hợp nhất!"""
-        
-        return {
-            "intent": "course_consultation",
-            "answer": qualification_questions,
-            "action": config["action"],
-            "next_step": "await_qualification",
-            "sources": [],
-            "needs_qualification": True
-        }
+        return dict(FALLBACK_CONSULTATION_RESPONSE)
     
     def handle_schedule_inquiry(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle lịch khai giảng - Dùng LLM format lịch ngắn gọn"""
         config = INTENTS_CONFIG["schedule_inquiry"]
         
         try:
-            # Lấy hardcode schedule
-            schedule_data = config["hardcode_schedule"]
-            user_text = user_input.lower()
+            user_text = normalize_input(user_input)
             
-            # Detect course type
-            if "vmware" in user_text or "vsphere" in user_text:
-                courses = schedule_data["VMware"]
-                course_type = "VMware"
-            elif "aws" in user_text or "cloud" in user_text:
-                courses = schedule_data["Cloud"] 
-                course_type = "Cloud"
-            else:
-                # Show all courses
-                courses = schedule_data["VMware"] + schedule_data["Cloud"]
-                course_type = "Tất cả"
+            # Detect course type (không khớp family nào -> show all courses)
+            course_type = next(
+                (family for family, keywords in SCHEDULE_FAMILY_KEYWORDS
+                 if any(keyword in user_text for keyword in keywords)),
+                "Tất cả"
+            )
             
-            # Sử dụng LLM để format lịch đẹp và ngắn gọn
-            schedule_prompt = ChatPromptTemplate.from_template("""
-Bạn là tư vấn viên Robusta Training. Khách hỏi lịch khai giảng, trả lời NGẮN GỌN.
-
-LỊCH KHAI GIẢNG {course_type}:
-{course_list}
-
-CÂU HỎI: {user_input}
-
-TRẢ LỜI NGẮN GỌN:
-- Hiển thị 1-2 khóa phù hợp nhất
-- Mời để lại thông tin để cập nhật lịch mới nhất
-
-TONE: Thân thiện, tự nhiên.
-""")
+            # Course list (top 3) đã format sẵn cho LLM
+            course_list = SCHEDULE_COURSE_LISTS[course_type]
             
-            # Format course list for LLM
-            course_list = ""
-            for course in courses[:3]:  # Limit to top 3
-                course_list += f"• {course['course']} - {course['date']} ({course['time']})\n"
-            
-            chain = schedule_prompt | self.llm | StrOutputParser()
-            formatted_answer = chain.invoke({
+            # Sử dụng LLM để format lịch đẹp và ngắn gọn
+            formatted_answer = self.chains["schedule"].invoke({
                 "course_type": course_type,
                 "course_list": course_list,
                 "user_input": user_input
@@ -480,8 +856,8 @@ TONE: Thân thiện, tự nhiên.
                 "sources": [{"file": "hardcode", "page": "internal", "content_preview": "Hardcode schedule data"}],
                 "used_llm": True
             }
-        except Exception as e:
-            print(f"Error formatting schedule: {e}")
+        except Exception:
+            logger.exception("Error formatting schedule")
             return {
                 "intent": "schedule_inquiry",
                 "answer": config["reply_template"],
@@ -502,24 +878,7 @@ TONE: Thân thiện, tự nhiên.
                 promotion_data = "Không thể truy cập thông tin ưu đãi."
             
             # Sử dụng LLM để format câu trả lời dựa trên data từ vectorDB
-            promotion_prompt = ChatPromptTemplate.from_template("""
-Bạn là tư vấn viên Robusta Training. Khách hỏi về ưu đãi, trả lời NGẮN GỌN, TRỰC TIẾP.
-
-THÔNG TIN ƯU ĐÃI TỪ DATABASE:
-{promotion_data}
-
-CÂU HỎI KHÁCH HÀNG: {user_input}
-
-HƯỚNG DẪN TRẢ LỜI:
-- Trả lời ngắn gọn (2-3 câu) dựa trên thông tin database
-- Tập trung vào ưu đãi phù hợp với câu hỏi
-- Kết thúc bằng mời để lại thông tin để tư vấn
-
-TONE: Thân thiện, tự nhiên.
-""")
-            
-            chain = promotion_prompt | self.llm | StrOutputParser()
-            formatted_answer = chain.invoke({
+            formatted_answer = self.chains["promotion"].invoke({
                 "user_input": user_input,
                 "promotion_data": promotion_data
             })
@@ -534,8 +893,8 @@ TONE: Thân thiện, tự nhiên.
                 "used_vectordb": True
             }
             
-        except Exception as e:
-            print(f"Error formatting promotion response: {e}")
+        except Exception:
+            logger.exception("Error formatting promotion response")
             return {
                 "intent": "promotion_inquiry",
                 "answer": config["reply_template"],
@@ -546,109 +905,23 @@ TONE: Thân thiện, tự nhiên.
     
     def handle_company_info(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle thông tin doanh nghiệp - Template reply mẫu"""
-        config = INTENTS_CONFIG["company_info"]
-        return {
-            "intent": "company_info",
-            "answer": config["reply_template"],
-            "action": config["action"],
-            "next_step": "collect_contact",
-            "sources": []
-        }
+        return dict(COMPANY_INFO_RESPONSE)
     
     def handle_training_for_company(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle đào tạo doanh nghiệp - Qualification questions cho B2B"""
-        config = INTENTS_CONFIG["training_for_company"]
-        
-        # Qualification questions cho doanh nghiệp
-        b2b_questions = """🏢 **Để tư vấn gói đào tạo doanh nghiệp tốt nhất, vui lòng cung cấp thông tin:**
-
-• **Quy mô:** Số lượng nhân viên cần đào tạo?
-• **Vị trí:** Nhân viên đang làm việc ở vị trí nào? (Dev, IT, Manager...)
-• **Nội dung:** Muốn đào tạo về lĩnh vực gì? (Cloud, AI, DevOps, Security...)
-• **Thời gian:** Dự kiến thời gian đào tạo? (1 tuần, 1 tháng, 3 tháng...)
-• **Hình thức:** Ưu tiên hình thức nào? (Onsite, Online, Hybrid)
-• **Mục tiêu:** Mục tiêu cụ thể sau đào tạo? (Lấy chứng chỉ, nâng cao kỹ năng, áp dụng vào dự án...)
-
-💼 **Robusta có kinh nghiệm đào tạo cho 300+ doanh nghiệp với các gói ưu đãi đặc biệt cho B2B!**
-
-📞 **Bạn có muốn để lại thông tin liên hệ để nhận tư vấn chi tiết từ team B2B không?**"""
-        
-        return {
-            "intent": "training_for_company",
-            "answer": b2b_questions,
-            "action": config["action"],
-            "next_step": "collect_company_info",
-            "sources": [],
-            "needs_qualification": True
-        }
+        return dict(TRAINING_FOR_COMPANY_RESPONSE)
     
     def handle_tech_consultation(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle trò chuyện công nghệ - Chỉ query RAG khi hỏi về khóa học cụ thể"""
-        config = INTENTS_CONFIG["tech_consultation"]
-        
-        user_text = user_input.lower()
+        user_text = normalize_input(user_input)
         
         # Kiểm tra xem có phải câu hỏi về khóa học cụ thể không
-        course_specific_keywords = [
-            "khóa học", "chứng chỉ", "lộ trình học", "đào tạo", "học tập",
-            "aws certification", "azure certification", "vmware certification",
-            "devops course", "ai course", "machine learning course"
-        ]
-        
-        is_course_question = any(keyword in user_text for keyword in course_specific_keywords)
-        
-        if is_course_question:
+        if COURSE_SPECIFIC_MATCHER.contains_any(user_text):
             # Redirect to course consultation intent instead of querying RAG here
-            return {
-                "intent": "tech_consultation",
-                "answer": """🎯 **Để tư vấn khóa học phù hợp nhất, mình cần chuyển sang chế độ tư vấn chuyên sâu.**
-
-Bạn vui lòng hỏi lại câu hỏi dưới dạng: "Tôi muốn được tư vấn khóa học về [lĩnh vực]"
-
-Ví dụ:
-• "Tôi muốn được tư vấn khóa học về AWS"
-• "Tư vấn lộ trình học DevOps cho mình"
-• "Khóa học AI nào phù hợp với người mới bắt đầu?"
-
-💡 **Như vậy mình sẽ thu thập thông tin của bạn để tư vấn chính xác nhất!**""",
-                "action": config["action"],
-                "next_step": "redirect_to_course_consultation",
-                "sources": [],
-                "redirect": "course_consultation"
-            }
+            return dict(TECH_REDIRECT_RESPONSE)
         
         # Template reply về xu hướng công nghệ chung - KHÔNG query RAG
-        tech_guidance = """🚀 **Xu hướng công nghệ 2025 và định hướng phát triển:**
-
-• **AI/Generative AI:** Cách mạng hóa mọi ngành - ChatGPT, Copilot, AI Integration
-• **Cloud-First Strategy:** Multi-cloud, Hybrid cloud là bắt buộc
-• **DevSecOps:** Tích hợp Security vào toàn bộ development lifecycle  
-• **Edge Computing:** Xử lý dữ liệu gần user, giảm latency
-• **Quantum Computing:** Công nghệ đột phá cho tương lai gần
-
-💼 **Kỹ năng HOT nhất hiện tại:**
-• **Cloud Architects:** AWS, Azure, GCP
-• **AI Engineers:** Machine Learning, Deep Learning
-• **DevOps Engineers:** Kubernetes, Docker, CI/CD
-• **Cybersecurity Specialists:** Zero Trust, Cloud Security
-• **Data Engineers:** Big Data, Analytics, Data Pipeline
-
-🎯 **Lộ trình phát triển sự nghiệp:**
-1. **Xác định specialization** - Chọn 1-2 lĩnh vực chuyên sâu
-2. **Hands-on practice** - Project thực tế, not just theory
-3. **Certification** - Chứng chỉ uy tín (AWS, Azure, CISSP...)
-4. **Community** - Network với professionals cùng lĩnh vực
-
-📚 **Muốn biết khóa học cụ thể? Hãy hỏi: "Tư vấn khóa học về [lĩnh vực]"**"""
-
-        return {
-            "intent": "tech_consultation",
-            "answer": tech_guidance,
-            "action": config["action"],
-            "next_step": "tech_follow_up",
-            "sources": [],
-            "used_rag": False
-        }
+        return dict(TECH_GUIDANCE_RESPONSE)
     
     def handle_policy_inquiry(self, user_input: str, session_id: str) -> Dict[str, Any]:
         """Handle chính sách học vụ - Lấy từ vectorDB và format qua LLM"""
@@ -662,24 +935,7 @@ Ví dụ:
                 policy_data = "Không thể truy cập thông tin chính sách."
             
             # Sử dụng LLM để format câu trả lời dựa trên data từ vectorDB
-            policy_prompt = ChatPromptTemplate.from_template("""
-Bạn là tư vấn viên Robusta Training. Khách hỏi về chính sách học vụ, trả lời NGẮN GỌN, CHÍNH XÁC.
-
-THÔNG TIN CHÍNH SÁCH TỪ DATABASE:
-{policy_data}
-
-CÂU HỎI KHÁCH HÀNG: {user_input}
-
-HƯỚNG DẪN TRẢ LỜI:
-- Trả lời ngắn gọn (1-2 câu) dựa trên thông tin database
-- Tập trung vào chính xác câu hỏi được hỏi
-- Kết thúc bằng mời để lại thông tin nếu cần hỗ trợ thêm
-
-TONE: Chuyên nghiệp, chính xác.
-""")
-            
-            chain = policy_prompt | self.llm | StrOutputParser()
-            formatted_answer = chain.invoke({
+            formatted_answer = self.chains["policy"].invoke({
                 "user_input": user_input,
                 "policy_data": policy_data
             })
@@ -694,8 +950,8 @@ TONE: Chuyên nghiệp, chính xác.
                 "used_vectordb": True
             }
             
-        except Exception as e:
-            print(f"Error formatting policy response: {e}")
+        except Exception:
+            logger.exception("Error formatting policy response")
             return {
                 "intent": "policy_inquiry",
                 "answer": config["reply_template"],
@@ -708,42 +964,29 @@ TONE: Chuyên nghiệp, chính xác.
         """Handle câu hỏi tổng quát - Dùng LLM để đáp ứng linh hoạt"""
         config = INTENTS_CONFIG["general_inquiry"]
         
+        key = normalize_input(user_input).strip()
         try:
-            # Sử dụng LLM để trả lời câu hỏi tổng quát về Robusta Training
-            general_prompt = ChatPromptTemplate.from_template("""
-Bạn là tư vấn viên Robusta Training. Trả lời NGẮN GỌN về các câu hỏi tổng quát.
-
-THÔNG TIN ROBUSTA:
-• Trung tâm đào tạo công nghệ hàng đầu
-• Chuyên: Cloud Computing, DevOps, Container, Kubernetes, CI/CD
-• Giảng viên giàu kinh nghiệm từ các công ty lớn
-• Học thực hành, dự án thực tế, hỗ trợ việc làm
-• Địa điểm: Hà Nội và TP.HCM
-• Hình thức: Offline và Online
-
-CÂU HỎI: {user_input}
-
-TRẢ LỜI NGẮN GỌN (1-2 câu):
-- Trả lời trực tiếp câu hỏi
-- Mời tư vấn thêm nếu cần
-
-TONE: Thân thiện, tự nhiên.
-""")
-            
-            chain = general_prompt | self.llm | StrOutputParser()
-            formatted_answer = chain.invoke({"user_input": user_input})
+            try:
+                self._general_cache.move_to_end(key)
+                answer = self._general_cache[key]
+            except KeyError:
+                # Sử dụng LLM để trả lời câu hỏi tổng quát về Robusta Training
+                answer = self.chains["general"].invoke({"user_input": user_input}).strip()
+                self._general_cache[key] = answer
+                while len(self._general_cache) > GENERAL_CACHE_SIZE:
+                    self._general_cache.popitem(last=False)
             
             return {
                 "intent": "general_inquiry",
-                "answer": formatted_answer.strip(),
+                "answer": answer,
                 "action": config["action"],
                 "next_step": "offer_consultation",
                 "sources": ["Robusta Training Information"],
                 "used_llm": True
             }
             
-        except Exception as e:
-            print(f"Error formatting general response: {e}")
+        except Exception:
+            logger.exception("Error formatting general response")
             return {
                 "intent": "general_inquiry",
                 "answer": config["reply_template"],
@@ -752,105 +995,229 @@ TONE: Thân thiện, tự nhiên.
                 "sources": []
             }
 
+    async def astream_general_inquiry(self, user_input: str) -> AsyncIterator[str]:
+        """Stream câu trả lời general_inquiry theo từng chunk (cùng cache với handle_general_inquiry)"""
+        key = normalize_input(user_input).strip()
+        answer = self._general_cache.get(key)
+        if answer is not None:
+            yield answer
+            return
+        
+        chunks = []
+        try:
+            async for chunk in self.chains["general"].astream({"user_input": user_input}):
+                chunks.append(chunk)
+                yield chunk
+        except Exception:
+            logger.exception("Error streaming general response")
+            if not chunks:
+                yield INTENTS_CONFIG["general_inquiry"]["reply_template"]
+            return
+        
+        self._general_cache[key] = "".join(chunks).strip()
+        while len(self._general_cache) > GENERAL_CACHE_SIZE:
+            self._general_cache.popitem(last=False)
+
+@functools.lru_cache(maxsize=1)
+def get_intent_classifier() -> IntentClassifier:
+    """Singleton IntentClassifier - get_llm() và prompt/chain chỉ build một lần mỗi process"""
+    return IntentClassifier()
+
+@functools.lru_cache(maxsize=1)
+def get_intent_handler() -> IntentHandler:
+    """Singleton IntentHandler - dùng chung chains giữa mọi RoutingChain"""
+    return IntentHandler()
+
+# Intent -> handler, intent không có trong bảng sẽ về handle_general_inquiry
+INTENT_HANDLERS = {
+    "course_inquiry": IntentHandler.handle_course_inquiry,
+    "course_consultation": IntentHandler.handle_course_consultation,
+    "schedule_inquiry": IntentHandler.handle_schedule_inquiry,
+    "promotion_inquiry": IntentHandler.handle_promotion_inquiry,
+    "company_info": IntentHandler.handle_company_info,
+    "training_for_company": IntentHandler.handle_training_for_company,
+    "tech_consultation": IntentHandler.handle_tech_consultation,
+    "policy_inquiry": IntentHandler.handle_policy_inquiry,
+    "general_inquiry": IntentHandler.handle_general_inquiry
+}
+
 class RoutingChain:
     """Main routing chain manager"""
     
     def __init__(self):
         try:
-            self.classifier = IntentClassifier()
-            self.handler = IntentHandler()
+            self.classifier = get_intent_classifier()
+            self.handler = get_intent_handler()
         except ImportError as e:
-            print(f"Error initializing routing chain: {e}")
+            logger.error("Error initializing routing chain: %s", e)
             self.classifier = None
             self.handler = None
     
+    def _unavailable_response(self, user_input: str, session_id: str) -> Dict[str, Any]:
+        return {
+            "intent": "error",
+            "answer": "Routing chain không khả dụng. Sử dụng RAG chain thông thường.",
+            "action": "fallback_to_rag",
+            "next_step": "retry",
+            "sources": [],
+            "session_id": session_id,
+            "user_input": user_input,
+            "routing_used": False,
+            "error": "Components not initialized"
+        }
+    
+    def _route(self, intent: str, user_input: str, session_id: str, enable_logging: bool) -> Dict[str, Any]:
+        """Route intent đã phân loại đến handler, thêm metadata và log"""
+        logger.info("Classified intent: %s", intent)
+        
+        # Step 2: Route to appropriate handler (fallback: general handler)
+        handler_method = INTENT_HANDLERS.get(intent, IntentHandler.handle_general_inquiry)
+        response = handler_method(self.handler, user_input, session_id)
+        
+        # Step 3: Add metadata
+        response.update({
+            "session_id": session_id,
+            "user_input": user_input,
+            "routing_used": True
+        })
+        
+        # Step 4: Log if enabled
+        if enable_logging:
+            self._log(user_input, response["answer"], intent, response.get("next_step"))
+        
+        return response
+    
+    def _log(self, user_input: str, answer: str, intent: str, next_step: Optional[str]) -> None:
+        if log_simple_chat is None:
+            return
+        try:
+            log_simple_chat(
+                question=user_input,
+                answer=answer,
+                metadata={
+                    "intent": intent,
+                    "next_step": next_step,
+                    "routing": True
+                }
+            )
+        except Exception as log_error:
+            logger.warning("Failed to log: %s", log_error)
+    
+    def _error_response(self, user_input: str, session_id: str, e: Exception, enable_logging: bool) -> Dict[str, Any]:
+        # Error fallback
+        error_response = {
+            "intent": "error",
+            "answer": "Xin lỗi, đã có lỗi xảy ra. Vui lòng thử lại hoặc liên hệ Robusta Training để được hỗ trợ.",
+            "action": "error_handling",
+            "next_step": "retry",
+            "sources": [],
+            "session_id": session_id,
+            "user_input": user_input,
+            "error": str(e),
+            "routing_used": True
+        }
+        
+        if enable_logging and log_simple_chat is not None:
+            try:
+                log_simple_chat(
+                    question=user_input,
+                    answer=error_response["answer"],
+                    metadata={"error": str(e), "routing": True}
+                )
+            except:
+                pass
+        
+        return error_response
+    
     def chat(self, user_input: str, session_id: str, enable_logging: bool = True) -> Dict[str, Any]:
         """
         Main chat function với routing
         """
         # Check if components are available
         if self.classifier is None or self.handler is None:
-            return {
-                "intent": "error",
-                "answer": "Routing chain không khả dụng. Sử dụng RAG chain thông thường.",
-                "action": "fallback_to_rag",
-                "next_step": "retry",
-                "sources": [],
-                "session_id": session_id,
-                "user_input": user_input,
-                "routing_used": False,
-                "error": "Components not initialized"
-            }
+            return self._unavailable_response(user_input, session_id)
         
         try:
             # Step 1: Classify intent
             intent = self.classifier.classify(user_input)
-            print(f"🎯 Classified intent: {intent}")
-            
-            # Step 2: Route to appropriate handler
-            handler_method = getattr(self.handler, f"handle_{intent}", None)
-            
-            if handler_method:
-                response = handler_method(user_input, session_id)
-            else:
-                # Fallback to general handler
-                response = self.handler.handle_general_inquiry(user_input, session_id)
-            
-            # Step 3: Add metadata
-            response.update({
-                "session_id": session_id,
-                "user_input": user_input,
-                "routing_used": True
-            })
-            
-            # Step 4: Log if enabled
-            if enable_logging and log_simple_chat is not None:
-                try:
-                    log_simple_chat(
-                        question=user_input,
-                        answer=response["answer"],
-                        metadata={
-                            "intent": intent,
-                            "next_step": response.get("next_step"),
-                            "routing": True
-                        }
-                    )
-                except Exception as log_error:
-                    print(f"Warning: Failed to log: {log_error}")
-            
-            return response
-            
+            return self._route(intent, user_input, session_id, enable_logging)
         except Exception as e:
-            # Error fallback
-            error_response = {
-                "intent": "error",
-                "answer": "Xin lỗi, đã có lỗi xảy ra. Vui lòng thử lại hoặc liên hệ Robusta Training để được hỗ trợ.",
-                "action": "error_handling",
-                "next_step": "retry",
-                "sources": [],
-                "session_id": session_id,
-                "user_input": user_input,
-                "error": str(e),
-                "routing_used": True
-            }
-            
-            if enable_logging and log_simple_chat is not None:
-                try:
-                    log_simple_chat(
-                        question=user_input,
-                        answer=error_response["answer"],
-                        metadata={"error": str(e), "routing": True}
-                    )
-                except:
-                    pass
-            
-            return error_response
+            return self._error_response(user_input, session_id, e, enable_logging)
+    
+    async def achat(self, user_input: str, session_id: str, enable_logging: bool = True) -> Dict[str, Any]:
+        """
+        Async chat: classify qua ainvoke, handler (sync LLM/vectorDB) chạy trong thread
+        để các session đồng thời không chặn nhau trên event loop
+        """
+        if self.classifier is None or self.handler is None:
+            return self._unavailable_response(user_input, session_id)
+        
+        try:
+            intent = await self.classifier.aclassify(user_input)
+            return await asyncio.to_thread(self._route, intent, user_input, session_id, enable_logging)
+        except Exception as e:
+            return self._error_response(user_input, session_id, e, enable_logging)
+    
+    async def achat_stream(self, user_input: str, session_id: str,
+                           enable_logging: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming chat: event đầu {"intent"}, sau đó các {"delta"}. general_inquiry stream token từ LLM;
+        intent khác trả lời một lần (handler cần kết quả tool/RAG trước khi sinh câu trả lời)
+        """
+        if self.classifier is None or self.handler is None:
+            response = self._unavailable_response(user_input, session_id)
+            yield {"intent": response["intent"]}
+            yield {"delta": response["answer"]}
+            return
+        
+        try:
+            intent = await self.classifier.aclassify(user_input)
+        except Exception as e:
+            response = self._error_response(user_input, session_id, e, enable_logging)
+            yield {"intent": response["intent"]}
+            yield {"delta": response["answer"]}
+            return
+        
+        yield {"intent": intent}
+        if intent not in INTENT_HANDLERS or intent == "general_inquiry":
+            logger.info("Classified intent: %s", intent)
+            chunks = []
+            async for chunk in self.handler.astream_general_inquiry(user_input):
+                chunks.append(chunk)
+                yield {"delta": chunk}
+            if enable_logging:
+                await asyncio.to_thread(self._log, user_input, "".join(chunks).strip(), intent, "offer_consultation")
+            return
+        
+        try:
+            response = await asyncio.to_thread(self._route, intent, user_input, session_id, enable_logging)
+        except Exception as e:
+            response = self._error_response(user_input, session_id, e, enable_logging)
+        yield {"delta": response["answer"]}
+    
+    async def handle_many(self, user_inputs: List[str], session_id: str,
+                          enable_logging: bool = True, max_concurrency: int = 10) -> List[Dict[str, Any]]:
+        """Xử lý nhiều messages: classify bằng một lần abatch rồi route song song, giữ thứ tự"""
+        if self.classifier is None or self.handler is None:
+            return [self._unavailable_response(user_input, session_id) for user_input in user_inputs]
+        
+        intents = await self.classifier.abatch_classify(user_inputs, max_concurrency=max_concurrency)
+        
+        async def _route_one(user_input: str, intent: str) -> Dict[str, Any]:
+            try:
+                return await asyncio.to_thread(self._route, intent, user_input, session_id, enable_logging)
+            except Exception as e:
+                return self._error_response(user_input, session_id, e, enable_logging)
+        
+        return await asyncio.gather(*[
+            _route_one(user_input, intent) for user_input, intent in zip(user_inputs, intents)
+        ])
 
 # Global routing chain manager - with safe initialization
 try:
     routing_chain_manager = RoutingChain()
 except Exception as e:
-    print(f"Warning: Could not initialize routing chain manager: {e}")
+    logger.warning("Could not initialize routing chain manager: %s", e)
     routing_chain_manager = None
 
 def get_routing_chain():
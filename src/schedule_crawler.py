@@ -1,52 +1,111 @@
 """
 Web Crawler cho lịch khai giảng Robusta
 """
-import requests
+import httpx
 from bs4 import BeautifulSoup
 from datetime import datetime
 import re
+import time
+import importlib.util
+from itertools import islice
 from typing import List, Dict
 
+try:
+    from lxml import etree, html as lxml_html  # C parser, nhanh hơn nhiều so với BeautifulSoup + html.parser
+except ImportError:
+    lxml_html = None
+
+# Compile/khởi tạo một lần khi import
+SCHEDULE_URL = "https://robusta.vn/"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+# Pattern ngày tháng (dd/mm/yyyy hoặc dd/mm)
+_DATE_RE = re.compile(r'\d{1,2}/\d{1,2}(?:/\d{4})?')
+
+# Client dùng chung để giữ connection (TCP+TLS) giữa các lần crawl
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_client = httpx.Client(headers=HEADERS, timeout=10, follow_redirects=True, http2=_HTTP2)
+_async_client = httpx.AsyncClient(headers=HEADERS, timeout=10, follow_redirects=True, http2=_HTTP2)
+
+# Lịch khai giảng thay đổi tối đa vài lần/ngày - cache kết quả crawl thành công trong 1 giờ
+SCHEDULE_TTL = 3600
+_schedule_cache = {"ts": 0.0, "val": None}
+
+CRAWL_ERROR_MESSAGE = "Không thể lấy lịch khai giảng từ website. Vui lòng liên hệ Robusta để biết thông tin mới nhất."
+
+def _cached_schedule():
+    """Kết quả crawl còn hạn trong cache, None nếu phải crawl lại"""
+    if _schedule_cache["val"] is not None and time.monotonic() - _schedule_cache["ts"] < SCHEDULE_TTL:
+        return _schedule_cache["val"]
+    return None
+
+def _page_text(content: bytes) -> str:
+    """Text của vùng lịch (#schedule) hoặc body - không quét cả document"""
+    if lxml_html is not None:
+        tree = lxml_html.fromstring(content)
+        container = tree.get_element_by_id('schedule', None)
+        if container is None:
+            container = tree.body if tree.find('body') is not None else tree
+        # Giống BeautifulSoup.get_text: bỏ script/style/comment
+        etree.strip_elements(container, 'script', 'style', etree.Comment, with_tail=False)
+        return " ".join(text.strip() for text in container.itertext() if text.strip())
+    
+    soup = BeautifulSoup(content, 'html.parser')
+    container = soup.find(id='schedule') or soup.body or soup
+    return container.get_text(separator=' ', strip=True)
+
+def _parse_schedule(content: bytes) -> str:
+    """Trích lịch khai giảng từ HTML trang chủ và lưu vào cache"""
+    # Tìm các khóa học và ngày khai giảng
+    # (Cần inspect website để tìm đúng selector)
+    
+    # Fallback: Tìm text có chứa từ khóa lịch khai giảng
+    text_content = _page_text(content)
+    
+    # Chỉ cần 3 ngày đầu tiên - dừng quét ngay khi đủ
+    date_patterns = [m.group(0) for m in islice(_DATE_RE.finditer(text_content), 3)]
+    
+    if date_patterns:
+        schedule_text = f"Lịch khai giảng gần nhất: {', '.join(date_patterns[:3])}"
+    else:
+        schedule_text = "Vui lòng liên hệ để biết lịch khai giảng chi tiết."
+    
+    _schedule_cache["ts"], _schedule_cache["val"] = time.monotonic(), schedule_text
+    return schedule_text
+
 def crawl_robusta_schedule() -> str:
     """
     Crawl lịch khai giảng từ website robusta.vn
     Returns: String chứa thông tin lịch khai giảng
     """
+    cached = _cached_schedule()
+    if cached is not None:
+        return cached
+    
     try:
-        # URL của trang lịch khai giảng Robusta
-        url = "https://robusta.vn/"
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
+        response = _client.get(SCHEDULE_URL)
         response.raise_for_status()
+        return _parse_schedule(response.content)
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Tìm các element chứa thông tin lịch khai giảng
-        schedule_info = []
-        
-        # Tìm các khóa học và ngày khai giảng
-        # (Cần inspect website để tìm đúng selector)
-        
-        # Fallback: Tìm text có chứa từ khóa lịch khai giảng
-        text_content = soup.get_text()
-        
-        # Tìm pattern ngày tháng (dd/mm/yyyy hoặc dd/mm)
-        date_patterns = re.findall(r'\d{1,2}/\d{1,2}(?:/\d{4})?', text_content)
-        
-        if date_patterns:
-            schedule_text = f"Lịch khai giảng gần nhất: {', '.join(date_patterns[:3])}"
-        else:
-            schedule_text = "Vui lòng liên hệ để biết lịch khai giảng chi tiết."
-            
-        return schedule_text
+    except Exception as e:
+        print(f"Error crawling schedule: {e}")
+        return CRAWL_ERROR_MESSAGE
+
+async def crawl_robusta_schedule_async() -> str:
+    """Async version của crawl_robusta_schedule - không block event loop khi chờ website"""
+    cached = _cached_schedule()
+    if cached is not None:
+        return cached
+    
+    try:
+        response = await _async_client.get(SCHEDULE_URL)
+        response.raise_for_status()
+        return _parse_schedule(response.content)
         
     except Exception as e:
         print(f"Error crawling schedule: {e}")
-        return "Không thể lấy lịch khai giảng từ website. Vui lòng liên hệ Robusta để biết thông tin mới nhất."
+        return CRAWL_ERROR_MESSAGE
 
 def get_schedule_info(course_name: str = None) -> str:
     """
@@ -59,6 +118,15 @@ def get_schedule_info(course_name: str = None) -> str:
     else:
         return f"Lịch khai giảng các khóa học: {base_schedule}"
 
+async def get_schedule_info_async(course_name: str = None) -> str:
+    """Async version của get_schedule_info"""
+    base_schedule = await crawl_robusta_schedule_async()
+    
+    if course_name:
+        return f"Lịch khai giảng khóa {course_name}: {base_schedule}"
+    else:
+        return f"Lịch khai giảng các khóa học: {base_schedule}"
+
 # Test function
 if __name__ == "__main__":
     schedule = crawl_robusta_schedule()
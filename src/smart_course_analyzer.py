@@ -6,9 +6,23 @@ AI-powered course matching system với intelligent analysis
 import os
 import sys
 import re
+import unicodedata
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
-import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    import ahocorasick  # pyahocorasick - optional, fallback quét substring
+except ImportError:
+    ahocorasick = None
 
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,14 +31,178 @@ if current_dir not in sys.path:
 
 try:
     from topic_vectordb import topic_vectordb
-    from llm_models import llm_manager
+    from llm_models import get_llm_manager
     from user_profile import UserProfile
 except ImportError as e:
     print(f"Import error in smart_course_analyzer.py: {e}")
 
-@dataclass
+# Prompt cho các bước dùng LLM: phần tĩnh (vai trò, rubric, output format) nằm ở system message
+# làm prefix cố định để provider cache; dữ liệu động (user context, course list) đứng cuối ở human message.
+SCORING_SYSTEM = """
+Bạn là chuyên gia tư vấn khóa học IT. Hãy tính điểm phù hợp (0-100) cho mỗi khóa học dựa trên thông tin user.
+
+COURSES TO SCORE là bảng, mỗi dòng một khóa học: id<TAB>topic<TAB>tên khóa học<TAB>mô tả ngắn
+
+Hãy trả về JSON format (mỗi id một phần tử):
+{"scores": [{"id": 0, "score": 85}, {"id": 1, "score": 70}]}
+
+CHỈ TRẢ VỀ JSON, KHÔNG GIẢI THÍCH THÊM.
+""".strip()
+
+SCORING_TEMPLATE = """USER CONTEXT:
+{user_context}
+
+COURSES TO SCORE:
+{course_list}"""
+
+COURSE_INFO_SYSTEM = """
+Bạn là tư vấn viên khóa học chuyên nghiệp. Hãy tạo thông tin chi tiết về khóa học dựa trên dữ liệu provided.
+
+Hãy tạo thông tin khóa học theo format:
+
+📚 **[Tên khóa học]**
+
+🎯 **Mô tả khóa học:**
+[Mô tả chi tiết]
+
+👥 **Đối tượng tham gia:**
+[Ai nên học khóa này]
+
+📋 **Nội dung chính:**
+• [Điểm 1]
+• [Điểm 2]
+• [Điểm 3]
+
+🎓 **Sau khóa học bạn sẽ:**
+• [Kỹ năng 1]
+• [Kỹ năng 2]
+
+⏱️ **Thời lượng:** [nếu có]
+
+📞 **Bước tiếp theo:**
+Để được tư vấn chi tiết lịch khai giảng và ưu đãi, bạn vui lòng để lại thông tin liên hệ nhé!
+
+Trả lời bằng tiếng Việt, chuyên nghiệp và thân thiện.
+""".strip()
+
+COURSE_INFO_TEMPLATE = """COURSE NAME: {course_name}
+
+COURSE DATA:
+{course_data}{user_context}"""
+
+RECOMMENDATIONS_SYSTEM = """
+Bạn là tư vấn viên khóa học chuyên nghiệp. Hãy tạo phản hồi tư vấn dựa trên các khóa học phù hợp đã tìm được.
+
+Hãy tạo phản hồi theo format:
+
+🎯 **Dựa trên yêu cầu của bạn, đây là các khóa học phù hợp:**
+
+**1. [Tên khóa học 1]** (⭐ [Điểm phù hợp])
+   • [Tóm tắt ngắn gọn]
+   • [Tại sao phù hợp]
+
+**2. [Tên khóa học 2]** (⭐ [Điểm phù hợp])
+   • [Tóm tắt ngắn gọn]
+   • [Tại sao phù hợp]
+
+**3. [Tên khóa học 3]** (⭐ [Điểm phù hợp])
+   • [Tóm tắt ngắn gọn]
+   • [Tại sao phù hợp]
+
+💡 **Lời khuyên:**
+[Gợi ý lộ trình hoặc khóa học nên ưu tiên]
+
+📞 **Bước tiếp theo:**
+Để được tư vấn chi tiết về lịch khai giảng và ưu đãi, bạn vui lòng để lại thông tin liên hệ!
+
+❓ **Bạn có quan tâm đến lĩnh vực liên quan nào khác không?** (VD: DevOps, Data Analytics, Mobile Development...)
+
+Viết bằng tiếng Việt, tự nhiên và chuyên nghiệp.
+""".strip()
+
+RECOMMENDATIONS_TEMPLATE = """USER QUERY: {user_input}
+
+MATCHED COURSES:
+{course_list}{user_profile}"""
+
+# Một block cho mỗi course/source, ghép bằng "".join thay vì += trong vòng lặp
+SCORING_ROW = "{i}\t{topic}\t{name}\t{desc}"
+COURSE_SOURCE_BLOCK = """
+Source {i}: {file_name}
+Content: {content}
+Score: {score:.3f}
+---
+"""
+RECOMMENDATION_BLOCK = """
+{i}. {name} (Topic: {topic})
+   Score: {score:.3f}
+   Description: {desc}...
+---
+"""
+
+# Câu trả lời tĩnh - định nghĩa một lần, handler trả về trực tiếp
+QUALIFICATION_QUESTIONS = """🎯 **Để tư vấn khóa học phù hợp, bạn vui lòng chia sẻ:**
+
+**1. Lĩnh vực làm việc hiện tại:**
+   • Developer, IT Support, System Admin, Student, Business Analyst...
+
+**2. Kỹ năng và kinh nghiệm:**
+   • Những công nghệ/tools đã biết (VD: Python, AWS, Linux...)
+   • Số năm kinh nghiệm trong IT
+
+**3. Mục tiêu sau khóa học:**
+   • Chuyển đổi nghề nghiệp, thăng tiến, lấy chứng chỉ, nâng cao kỹ năng...
+
+💡 **Với thông tin này, mình sẽ tư vấn khóa học cụ thể và phù hợp nhất!**"""
+SPECIFIC_COURSE_ERROR_MESSAGE = "Có lỗi xảy ra khi tìm kiếm thông tin khóa học. Vui lòng thử lại."
+NO_MATCHING_COURSES_MESSAGE = "Không tìm thấy khóa học phù hợp. Vui lòng chia sẻ thêm thông tin để tư vấn chi tiết."
+TOPIC_SEARCH_ERROR_MESSAGE = "Có lỗi xảy ra khi tìm kiếm khóa học. Vui lòng thử lại."
+RECOMMENDATIONS_FALLBACK_MESSAGE = "Đã tìm thấy một số khóa học phù hợp. Vui lòng liên hệ để được tư vấn chi tiết."
+
+# Known course names (từ VectorDB)
+KNOWN_COURSES = [
+    "Đào Tạo Lập Trình Ứng Dụng Trên Thiết Bị Di Động Nâng Cao",
+    "Khám phá và triển khai giải pháp Ảo hóa thay thế VMware",
+    "ROBUSTA - CLOUD COMPUTING FUNDAMENTALS",
+    "Cài đặt, cấu hình và quản trị cơ bản OpenStack",
+    "BigData Nâng Cao",
+    "Quản trị hệ thống Big Data",
+    "VMware vSphere",
+    "React Native",
+    "Cloud Computing",
+    "Big Data"
+]
+
+_WORD_RE = re.compile(r"\w+")
+
+def normalize_text(text: str) -> str:
+    """NFC + lowercase - input dạng NFD từ một số bộ gõ sẽ không khớp keywords tiếng Việt nếu không chuẩn hóa"""
+    return unicodedata.normalize("NFC", text).lower()
+
+TOPIC_KEYWORDS = {
+    "cloud": ["cloud", "aws", "azure", "gcp", "docker", "kubernetes", "devops", "openstack"],
+    "virtualization": ["vmware", "ảo hóa", "virtualization", "vsphere", "hyper-v", "esxi"],
+    "bigdata": ["bigdata", "big data", "data engineer", "hadoop", "spark", "data science", "analytics"],
+    "mobile": ["mobile", "di động", "app", "react native", "android", "ios", "flutter"]
+}
+
+# Bỏ code fence ```json ... ``` nếu model vẫn bọc JSON trong markdown
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Fallback embedding khi không keyword nào khớp - opt-in cho đến khi đo được độ chính xác
+TOPIC_EMBEDDING_FALLBACK = os.getenv("TOPIC_EMBEDDING_FALLBACK", "0") == "1"
+# Chỉ nhận topic top-1 khi cosine bỏ xa topic thứ hai (cosine tuyệt đối giữa text không liên quan vẫn cao)
+TOPIC_SIMILARITY_MARGIN = float(os.getenv("TOPIC_SIMILARITY_MARGIN", "0.05"))
+
+# Bỏ qua LLM scoring khi VectorDB đã chắc chắn: top hit đủ cao và bỏ xa hit thứ hai
+CONFIDENT_VECTOR_SCORE = 0.8
+CONFIDENT_VECTOR_MARGIN = 0.15
+
+COURSE_COLLECTIONS = ["robusta_cloud", "robusta_virtualization", "robusta_bigdata", "robusta_mobile"]
+
+@dataclass(slots=True)
 class CourseInfo:
-    """Structured course information"""
+    """Structured course information (slots: tạo cho mọi search result, không cần __dict__)"""
     name: str
     topic: str
     description: str
@@ -40,62 +218,83 @@ class SmartCourseAnalyzer:
     """AI-powered course analysis và matching system"""
     
     def __init__(self):
-        self.llm = llm_manager.get_llm()
+        self.llm_manager = get_llm_manager()
+        self.llm = self.llm_manager.get_llm()
         self.vectordb = topic_vectordb
+        # Mỗi search là một network round-trip (embed + Qdrant) - chạy song song giữa các collection
+        self._search_pool = ThreadPoolExecutor(max_workers=len(COURSE_COLLECTIONS))
+        
+        # Significant words (bỏ từ ngắn) của từng khóa học, tính một lần
+        self._course_sig_sets = []
+        for course in KNOWN_COURSES:
+            significant_words = frozenset(w for w in _WORD_RE.findall(normalize_text(course)) if len(w) > 3)
+            if significant_words:
+                self._course_sig_sets.append((course, significant_words))
+        self._all_course_words = frozenset().union(*(words for _, words in self._course_sig_sets))
+        self._min_topic_keyword_len = min(len(k) for keywords in TOPIC_KEYWORDS.values() for k in keywords)
+        # Ma trận embedding (đã normalize) của các topic - embed một batch ở lần dùng đầu tiên
+        self._topic_vectors = None
+        self._topic_vectors_failed = False
         
-        # Course name patterns for exact matching
-        self.course_name_patterns = [
-            r"khóa học (.+?)(?:\s|$)",
-            r"course (.+?)(?:\s|$)", 
-            r"(.+?)\s*(?:course|khóa học)",
-            r"(?:về|about)\s+(.+?)(?:\s|$)"
-        ]
+        # Một automaton cho mọi topic keyword: một lượt quét input thay vì ~25 lần `in`
+        self._topic_automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for topic, keywords in TOPIC_KEYWORDS.items():
+                for keyword in keywords:
+                    automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._topic_automaton = automaton
+        self._keyword_topics = {}
+        for topic, keywords in TOPIC_KEYWORDS.items():
+            for keyword in keywords:
+                self._keyword_topics.setdefault(keyword, []).append(topic)
+        
+        # Build chain một lần, mỗi request chỉ điền biến
+        # JSON mode: provider trả về JSON thuần, không cần bóc markdown
+        json_llm = self.llm.bind(response_format={"type": "json_object"})
+        self.scoring_chain = self._build_chain(SCORING_SYSTEM, SCORING_TEMPLATE, llm=json_llm)
+        self.course_info_chain = self._build_chain(COURSE_INFO_SYSTEM, COURSE_INFO_TEMPLATE)
+        self.recommendations_chain = self._build_chain(RECOMMENDATIONS_SYSTEM, RECOMMENDATIONS_TEMPLATE)
+    
+    def _build_chain(self, system_text: str, human_template: str, llm=None):
+        """Chain với system message tĩnh (cacheable) + human message chứa dữ liệu động"""
+        prompt = ChatPromptTemplate.from_messages([
+            self.llm_manager.system_message(system_text),
+            ("human", human_template)
+        ])
+        return prompt | (llm or self.llm) | StrOutputParser()
     
     def analyze_user_query(self, user_input: str, user_profile: UserProfile = None) -> Dict[str, Any]:
         """Phân tích query và quyết định strategy"""
         
+        # Normalize một lần, dùng chung cho các bước detect
+        user_lower = normalize_text(user_input)
+        
         # Step 1: Detect if user mentions specific course name
-        specific_course = self._detect_specific_course(user_input)
+        specific_course = self._detect_specific_course(user_lower)
         
         if specific_course:
             # Strategy A: Direct course information retrieval
             return self._get_specific_course_info(specific_course, user_profile)
         else:
             # Strategy B: Topic-based matching with AI scoring
-            return self._get_topic_based_recommendations(user_input, user_profile)
+            return self._get_topic_based_recommendations(user_input, user_profile, user_lower)
     
-    def _detect_specific_course(self, user_input: str) -> Optional[str]:
-        """Detect if user mentions a specific course name"""
+    def _detect_specific_course(self, user_lower: str) -> Optional[str]:
+        """Detect if user mentions a specific course name (user_lower: input đã qua normalize_text)"""
         
-        # Known course names (từ VectorDB)
-        known_courses = [
-            "Đào Tạo Lập Trình Ứng Dụng Trên Thiết Bị Di Động Nâng Cao",
-            "Khám phá và triển khai giải pháp Ảo hóa thay thế VMware",
-            "ROBUSTA - CLOUD COMPUTING FUNDAMENTALS",
-            "Cài đặt, cấu hình và quản trị cơ bản OpenStack",
-            "BigData Nâng Cao",
-            "Quản trị hệ thống Big Data",
-            "VMware vSphere",
-            "React Native",
-            "Cloud Computing",
-            "Big Data"
-        ]
+        # Significant words dài > 3 ký tự - input ngắn hơn không thể khớp
+        if len(user_lower) < 4:
+            return None
+        user_words = frozenset(_WORD_RE.findall(user_lower))
+        if user_words.isdisjoint(self._all_course_words):
+            return None
         
-        user_lower = user_input.lower()
-        
-        # Exact or partial matches
-        for course in known_courses:
-            course_lower = course.lower()
-            # Check if significant portion of course name is mentioned
-            words = course_lower.split()
-            significant_words = [w for w in words if len(w) > 3]  # Skip short words
-            
-            if len(significant_words) > 0:
-                matched_words = sum(1 for word in significant_words if word in user_lower)
-                match_ratio = matched_words / len(significant_words)
-                
-                if match_ratio >= 0.6:  # 60% of significant words match
-                    return course
+        # Exact or partial matches: 60% significant words của tên khóa học xuất hiện trong input
+        for course, significant_words in self._course_sig_sets:
+            if len(significant_words & user_words) / len(significant_words) >= 0.6:
+                return course
         
         return None
     
@@ -106,14 +305,17 @@ class SmartCourseAnalyzer:
             # Search across all collections for this course
             all_results = []
             
-            for collection in ["robusta_cloud", "robusta_virtualization", "robusta_bigdata", "robusta_mobile"]:
+            def search_collection(collection: str) -> List[Dict]:
                 try:
                     results = self.vectordb.search_by_topic(course_name, collection.replace("robusta_", ""), limit=5)
-                    for result in results:
-                        result["collection"] = collection
-                    all_results.extend(results)
-                except:
-                    continue
+                except Exception:
+                    return []
+                for result in results:
+                    result["collection"] = collection
+                return results
+            
+            for results in self._search_pool.map(search_collection, COURSE_COLLECTIONS):
+                all_results.extend(results)
             
             if not all_results:
                 return {
@@ -124,7 +326,8 @@ class SmartCourseAnalyzer:
                 }
             
             # Sort by relevance score
-            all_results.sort(key=lambda x: x["score"], reverse=True)
+            scores = np.array([result["score"] for result in all_results])
+            all_results = [all_results[i] for i in np.argsort(-scores, kind="stable")]
             
             # Use LLM to format course information
             course_info = self._format_course_info_with_llm(course_name, all_results[:3], user_profile)
@@ -143,10 +346,11 @@ class SmartCourseAnalyzer:
                 "type": "specific_course",
                 "course_name": course_name,
                 "found": False,
-                "message": "Có lỗi xảy ra khi tìm kiếm thông tin khóa học. Vui lòng thử lại."
+                "message": SPECIFIC_COURSE_ERROR_MESSAGE
             }
     
-    def _get_topic_based_recommendations(self, user_input: str, user_profile: UserProfile = None) -> Dict[str, Any]:
+    def _get_topic_based_recommendations(self, user_input: str, user_profile: UserProfile = None,
+                                         user_lower: str = None) -> Dict[str, Any]:
         """Get AI-powered topic-based course recommendations - Kiểm tra qualification trước"""
         
         try:
@@ -156,40 +360,43 @@ class SmartCourseAnalyzer:
                     "type": "topic_based",
                     "found": False,
                     "needs_qualification": True,
-                    "message": self._get_qualification_questions()
+                    "message": QUALIFICATION_QUESTIONS
                 }
             
             # Step 2: Detect interested topics
-            interested_topics = self._detect_topics_from_input(user_input)
+            interested_topics = self._detect_topics_from_input(user_lower or normalize_text(user_input), user_input)
             
             # Step 3: Get all courses from relevant collections
             all_courses = []
             
-            for topic in interested_topics:
-                collection_name = f"robusta_{topic}"
+            def search_topic(topic: str) -> List[CourseInfo]:
                 try:
                     # Get broader search to capture all courses in topic
                     results = self.vectordb.search_by_topic(user_input, topic, limit=10)
                     
-                    for result in results:
-                        course_info = CourseInfo(
+                    return [
+                        CourseInfo(
                             name=result.get("course_title", result.get("file_name", "Unknown Course")),
                             topic=topic,
                             description=result["content"],
                             source_file=result.get("file_name", ""),
                             score=result["score"]
                         )
-                        all_courses.append(course_info)
+                        for result in results
+                    ]
                         
                 except Exception as e:
                     print(f"Error searching topic {topic}: {e}")
-                    continue
+                    return []
+            
+            for courses in self._search_pool.map(search_topic, interested_topics):
+                all_courses.extend(courses)
             
             if not all_courses:
                 return {
                     "type": "topic_based",
                     "found": False,
-                    "message": "Không tìm thấy khóa học phù hợp. Vui lòng chia sẻ thêm thông tin để tư vấn chi tiết."
+                    "message": NO_MATCHING_COURSES_MESSAGE
                 }
             
             # Step 4: AI-powered matching score calculation
@@ -211,7 +418,7 @@ class SmartCourseAnalyzer:
             return {
                 "type": "topic_based",
                 "found": False,
-                "message": "Có lỗi xảy ra khi tìm kiếm khóa học. Vui lòng thử lại."
+                "message": TOPIC_SEARCH_ERROR_MESSAGE
             }
     
     def _has_sufficient_profile_info(self, user_profile: UserProfile) -> bool:
@@ -228,38 +435,26 @@ class SmartCourseAnalyzer:
             
         return info_count >= 2  # Cần ít nhất 2/3 thông tin
     
-    def _get_qualification_questions(self) -> str:
-        """Trả về câu hỏi qualification chuẩn"""
-        return """🎯 **Để tư vấn khóa học phù hợp, bạn vui lòng chia sẻ:**
-
-**1. Lĩnh vực làm việc hiện tại:**
-   • Developer, IT Support, System Admin, Student, Business Analyst...
-
-**2. Kỹ năng và kinh nghiệm:**
-   • Những công nghệ/tools đã biết (VD: Python, AWS, Linux...)
-   • Số năm kinh nghiệm trong IT
-
-**3. Mục tiêu sau khóa học:**
-   • Chuyển đổi nghề nghiệp, thăng tiến, lấy chứng chỉ, nâng cao kỹ năng...
-
-💡 **Với thông tin này, mình sẽ tư vấn khóa học cụ thể và phù hợp nhất!**"""
-    
-    def _detect_topics_from_input(self, user_input: str) -> List[str]:
-        """Detect topics from user input using keyword matching"""
+    def _detect_topics_from_input(self, user_lower: str, user_input: str = None) -> List[str]:
+        """Detect topics from user input using keyword matching (user_lower: input đã qua normalize_text)"""
         
-        topic_keywords = {
-            "cloud": ["cloud", "aws", "azure", "gcp", "docker", "kubernetes", "devops", "openstack"],
-            "virtualization": ["vmware", "ảo hóa", "virtualization", "vsphere", "hyper-v", "esxi"],
-            "bigdata": ["bigdata", "big data", "data engineer", "hadoop", "spark", "data science", "analytics"],
-            "mobile": ["mobile", "di động", "app", "react native", "android", "ios", "flutter"]
-        }
+        # Input ngắn hơn keyword ngắn nhất ("aws", "app"...) thì chắc chắn không khớp topic nào
+        if len(user_lower) < self._min_topic_keyword_len:
+            return ["cloud"]
         
-        user_lower = user_input.lower()
-        detected_topics = []
+        if self._topic_automaton is not None:
+            matched = {topic for _, keyword in self._topic_automaton.iter(user_lower)
+                       for topic in self._keyword_topics[keyword]}
+            detected_topics = [topic for topic in TOPIC_KEYWORDS if topic in matched]
+        else:
+            detected_topics = [
+                topic for topic, keywords in TOPIC_KEYWORDS.items()
+                if any(keyword in user_lower for keyword in keywords)
+            ]
         
-        for topic, keywords in topic_keywords.items():
-            if any(keyword in user_lower for keyword in keywords):
-                detected_topics.append(topic)
+        # Không keyword nào khớp: so embedding để bắt cách diễn đạt khác ("máy ảo" -> virtualization)
+        if not detected_topics and TOPIC_EMBEDDING_FALLBACK:
+            detected_topics = self._detect_topics_by_embedding(user_input or user_lower)
         
         # Default to cloud if no specific topic detected
         if not detected_topics:
@@ -267,64 +462,80 @@ class SmartCourseAnalyzer:
         
         return detected_topics
     
+    def _topic_matrix(self) -> Optional[np.ndarray]:
+        """(n_topics, d) embedding của keywords từng topic, mỗi hàng đã normalize - None nếu embed lỗi (không thử lại mỗi request)"""
+        if self._topic_vectors is None and not self._topic_vectors_failed:
+            try:
+                vectors = np.array(self.llm_manager.get_embeddings().embed_documents(
+                    [" ".join(keywords) for keywords in TOPIC_KEYWORDS.values()]
+                ), dtype=np.float32)
+                self._topic_vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            except Exception as e:
+                print(f"Error embedding topic keywords, disabling embedding fallback: {e}")
+                self._topic_vectors_failed = True
+        return self._topic_vectors
+    
+    def _detect_topics_by_embedding(self, user_input: str) -> List[str]:
+        """Topic top-1 theo cosine similarity nếu bỏ xa topic thứ hai, [] nếu không rõ ràng"""
+        matrix = self._topic_matrix()
+        if matrix is None:
+            return []
+        
+        try:
+            # Embed qua cache query của VectorDB - search_by_topic sau đó dùng lại, không embed lần hai
+            query = np.asarray(self.vectordb.embed_query(user_input), dtype=np.float32)
+        except Exception as e:
+            print(f"Error detecting topics by embedding: {e}")
+            return []
+        
+        similarities = matrix @ (query / np.linalg.norm(query))
+        runner_up, best = np.argsort(similarities)[-2:]
+        if similarities[best] - similarities[runner_up] < TOPIC_SIMILARITY_MARGIN:
+            return []
+        return [list(TOPIC_KEYWORDS)[best]]
+    
     def _calculate_ai_matching_scores(self, courses: List[CourseInfo], user_input: str, user_profile: UserProfile = None) -> List[CourseInfo]:
         """Use LLM to calculate intelligent matching scores"""
         
+        vector_scores = np.array([course.score for course in courses])
+        order = np.argsort(-vector_scores, kind="stable")
+        top_scores = vector_scores[order[:2]]
+        if top_scores.size and top_scores[0] > CONFIDENT_VECTOR_SCORE and (
+                top_scores.size == 1 or top_scores[0] - top_scores[1] > CONFIDENT_VECTOR_MARGIN):
+            return [courses[i] for i in order]
+        
         try:
             # Prepare user context
             user_context = self._prepare_user_context(user_input, user_profile)
             
-            # Create scoring prompt
-            scoring_prompt = f"""
-Bạn là chuyên gia tư vấn khóa học IT. Hãy tính điểm phù hợp (0-100) cho mỗi khóa học dựa trên thông tin user.
-
-USER CONTEXT:
-{user_context}
-
-COURSES TO SCORE:
-"""
-            
-            for i, course in enumerate(courses):
-                scoring_prompt += f"""
-Course {i+1}: {course.name}
-Topic: {course.topic}
-Description: {course.description[:200]}...
----
-"""
-            
-            scoring_prompt += """
-Hãy trả về JSON format:
-{
-    "scores": [
-        {"course_index": 0, "score": 85, "reason": "lý do phù hợp"},
-        {"course_index": 1, "score": 70, "reason": "lý do phù hợp"},
-        ...
-    ]
-}
-
-CHỈ TRẢ VỀ JSON, KHÔNG GIẢI THÍCH THÊM.
-"""
+            # Bảng gọn id|topic|name|desc - id tạm là vị trí trong list, LLM chỉ trả về {id, score}
+            course_list = "\n".join(
+                SCORING_ROW.format(i=i, topic=course.topic, name=course.name[:80],
+                                   desc=" ".join(course.description[:120].split()))
+                for i, course in enumerate(courses)
+            )
             
             # Get LLM response
-            response = self.llm.invoke(scoring_prompt)
-            response_text = response.content.strip()
+            response_text = self.scoring_chain.invoke({
+                "user_context": user_context,
+                "course_list": course_list
+            }).strip()
             
             # Parse JSON response
-            if response_text.startswith('```json'):
-                response_text = response_text.replace('```json', '').replace('```', '').strip()
+            scoring_result = json_loads(_FENCE_RE.sub('', response_text))
             
-            scoring_result = json.loads(response_text)
+            # Apply scores to courses (id ngoài khoảng bị bỏ qua, khóa không được chấm giữ điểm VectorDB)
+            score_entries = scoring_result.get("scores", [])
+            ids = np.array([int(entry.get("id", -1)) for entry in score_entries], dtype=np.int64)
+            values = np.array([float(entry.get("score", 0)) for entry in score_entries]) / 100.0  # Normalize to 0-1
+            valid = (ids >= 0) & (ids < len(courses))
+            scores = np.array([course.score for course in courses])
+            scores[ids[valid]] = values[valid]
+            for course, score in zip(courses, scores.tolist()):
+                course.score = score
             
-            # Apply scores to courses
-            for score_info in scoring_result.get("scores", []):
-                course_idx = score_info.get("course_index", 0)
-                if 0 <= course_idx < len(courses):
-                    courses[course_idx].score = float(score_info.get("score", 0)) / 100.0  # Normalize to 0-1
-            
-            # Sort by AI score
-            courses.sort(key=lambda x: x.score, reverse=True)
-            
-            return courses
+            # Sort by AI score (stable, giảm dần - cùng thứ tự với sort(reverse=True))
+            return [courses[i] for i in np.argsort(-scores, kind="stable")]
             
         except Exception as e:
             print(f"Error in AI scoring: {e}")
@@ -353,59 +564,26 @@ User Profile:
         """Format course information using LLM"""
         
         try:
-            format_prompt = f"""
-Bạn là tư vấn viên khóa học chuyên nghiệp. Hãy tạo thông tin chi tiết về khóa học dựa trên dữ liệu provided.
-
-COURSE NAME: {course_name}
-
-COURSE DATA:
-"""
-            
-            for i, result in enumerate(results):
-                format_prompt += f"""
-Source {i+1}: {result.get('file_name', 'Unknown')}
-Content: {result['content']}
-Score: {result['score']:.3f}
----
-"""
+            course_data = "".join(
+                COURSE_SOURCE_BLOCK.format(i=i + 1, file_name=result.get('file_name', 'Unknown'),
+                                           content=result['content'], score=result['score'])
+                for i, result in enumerate(results)
+            )
             
+            user_context = ""
             if user_profile and (user_profile.work_field or user_profile.goal):
-                format_prompt += f"""
+                user_context = f"""
 USER CONTEXT:
 - Background: {user_profile.work_field or 'Not specified'}
 - Goal: {user_profile.goal or 'Not specified'}
 """
             
-            format_prompt += """
-Hãy tạo thông tin khóa học theo format:
-
-📚 **[Tên khóa học]**
-
-🎯 **Mô tả khóa học:**
-[Mô tả chi tiết]
-
-👥 **Đối tượng tham gia:**
-[Ai nên học khóa này]
-
-📋 **Nội dung chính:**
-• [Điểm 1]
-• [Điểm 2]
-• [Điểm 3]
-
-🎓 **Sau khóa học bạn sẽ:**
-• [Kỹ năng 1]
-• [Kỹ năng 2]
-
-⏱️ **Thời lượng:** [nếu có]
-
-📞 **Bước tiếp theo:**
-Để được tư vấn chi tiết lịch khai giảng và ưu đãi, bạn vui lòng để lại thông tin liên hệ nhé!
-
-Trả lời bằng tiếng Việt, chuyên nghiệp và thân thiện.
-"""
-            
-            response = self.llm.invoke(format_prompt)
-            return response.content.strip()
+            response = self.course_info_chain.invoke({
+                "course_name": course_name,
+                "course_data": course_data,
+                "user_context": user_context
+            })
+            return response.strip()
             
         except Exception as e:
             print(f"Error formatting course info: {e}")
@@ -415,64 +593,31 @@ Trả lời bằng tiếng Việt, chuyên nghiệp và thân thiện.
         """Format topic-based recommendations using LLM"""
         
         try:
-            format_prompt = f"""
-Bạn là tư vấn viên khóa học chuyên nghiệp. Hãy tạo phản hồi tư vấn dựa trên các khóa học phù hợp đã tìm được.
-
-USER QUERY: {user_input}
-
-MATCHED COURSES:
-"""
-            
-            for i, course in enumerate(courses):
-                format_prompt += f"""
-{i+1}. {course.name} (Topic: {course.topic})
-   Score: {course.score:.3f}
-   Description: {course.description[:150]}...
----
-"""
+            course_list = "".join(
+                RECOMMENDATION_BLOCK.format(i=i + 1, name=course.name, topic=course.topic,
+                                            score=course.score, desc=course.description[:150])
+                for i, course in enumerate(courses)
+            )
             
+            profile_block = ""
             if user_profile and (user_profile.work_field or user_profile.goal):
-                format_prompt += f"""
+                profile_block = f"""
 USER PROFILE:
 - Background: {user_profile.work_field or 'Not specified'}
 - Goal: {user_profile.goal or 'Not specified'}
 - Skills: {', '.join(user_profile.current_skills) if user_profile.current_skills else 'Not specified'}
 """
             
-            format_prompt += """
-Hãy tạo phản hồi theo format:
-
-🎯 **Dựa trên yêu cầu của bạn, đây là các khóa học phù hợp:**
-
-**1. [Tên khóa học 1]** (⭐ [Điểm phù hợp])
-   • [Tóm tắt ngắn gọn]
-   • [Tại sao phù hợp]
-
-**2. [Tên khóa học 2]** (⭐ [Điểm phù hợp])
-   • [Tóm tắt ngắn gọn]
-   • [Tại sao phù hợp]
-
-**3. [Tên khóa học 3]** (⭐ [Điểm phù hợp])
-   • [Tóm tắt ngắn gọn]
-   • [Tại sao phù hợp]
-
-💡 **Lời khuyên:**
-[Gợi ý lộ trình hoặc khóa học nên ưu tiên]
-
-📞 **Bước tiếp theo:**
-Để được tư vấn chi tiết về lịch khai giảng và ưu đãi, bạn vui lòng để lại thông tin liên hệ!
-
-❓ **Bạn có quan tâm đến lĩnh vực liên quan nào khác không?** (VD: DevOps, Data Analytics, Mobile Development...)
-
-Viết bằng tiếng Việt, tự nhiên và chuyên nghiệp.
-"""
-            
-            response = self.llm.invoke(format_prompt)
-            return response.content.strip()
+            response = self.recommendations_chain.invoke({
+                "user_input": user_input,
+                "course_list": course_list,
+                "user_profile": profile_block
+            })
+            return response.strip()
             
         except Exception as e:
             print(f"Error formatting recommendations: {e}")
-            return "Đã tìm thấy một số khóa học phù hợp. Vui lòng liên hệ để được tư vấn chi tiết."
+            return RECOMMENDATIONS_FALLBACK_MESSAGE
 
 # Singleton instance
 smart_analyzer = SmartCourseAnalyzer()
@@ -5,12 +5,33 @@ Quản lý VectorDB theo từng topic: ảo hóa, BigData, Cloud Computing, Lậ
 
 import os
 import sys
+import asyncio
+import uuid
+import threading
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import List, Dict, Any, Optional
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, OptimizersConfigDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    Filter, FieldCondition, MatchValue, HasIdCondition, FilterSelector
+)
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 
+try:
+    import ahocorasick  # pyahocorasick - optional, fallback quét substring
+except ImportError:
+    ahocorasick = None
+
+try:
+    import pypdfium2 as pdfium  # PDFium C bindings - optional, fallback PyPDFLoader
+except ImportError:
+    pdfium = None
+
 # Add current directory to Python path FIRST
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -21,8 +42,8 @@ if parent_dir not in sys.path:
 
 # Now try imports
 try:
-    from llm_models import llm_manager
-    from document_processing.pdf_loader import PDFLoader
+    from llm_models import get_llm_manager
+    from document_processing.pdf_loader import PDFLoader, load_pdf_worker
     from document_processing.text_cleaner import TextCleaner
     from document_processing.course_extractor import CourseInfoExtractor
     print("✅ Standard imports successful")
@@ -31,8 +52,8 @@ except ImportError as e:
     try:
         # Direct imports from document_processing
         sys.path.insert(0, os.path.join(current_dir, 'document_processing'))
-        from llm_models import llm_manager
-        from pdf_loader import PDFLoader
+        from llm_models import get_llm_manager
+        from pdf_loader import PDFLoader, load_pdf_worker
         from text_cleaner import TextCleaner
         from course_extractor import CourseInfoExtractor
         print("✅ Direct imports successful")
@@ -42,6 +63,27 @@ except ImportError as e:
 
 load_dotenv()
 
+# Bulk upload tuning - sweep theo dataset/cluster thực tế
+QDRANT_BATCH_SIZE = int(os.getenv("QDRANT_BATCH_SIZE", "64"))
+# parallel > 1 khởi động worker processes mỗi lần upload_collection, chỉ đáng khi upload rất lớn
+QDRANT_PARALLEL = int(os.getenv("QDRANT_PARALLEL", "1"))
+# indexing_threshold mặc định của Qdrant, bật lại sau khi bulk upload xong
+INDEXING_THRESHOLD = 20000
+# Số upsert request đồng thời tới Qdrant - 2 là điểm tối ưu khi benchmark
+UPSERT_CONCURRENCY = 2
+# Raw-text fallback dùng pypdfium2 (nhanh hơn pypdf nhiều lần), tắt để quay về PyPDFLoader
+USE_PDFIUM = os.getenv("USE_PDFIUM", "true").lower() == "true"
+# Số texts tối đa mỗi embed_documents request (giới hạn của provider, vd Cohere 96)
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "96"))
+
+# Namespace cho point IDs deterministic (uuid5) - ổn định giữa các process, không phụ thuộc PYTHONHASHSEED
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "robusta/topic_vectordb")
+
+# LRU cache embedding của query - chat retry / câu hỏi lặp lại không tốn thêm request
+QUERY_CACHE_SIZE = 2048
+_QUERY_CACHE: "OrderedDict[str, List[float]]" = OrderedDict()
+_QUERY_CACHE_LOCK = threading.Lock()
+
 class TopicVectorDB:
     """Quản lý VectorDB theo từng topic cụ thể"""
     
@@ -62,13 +104,45 @@ class TopicVectorDB:
     }
     
     def __init__(self):
+        # Data paths - tính một lần
+        self._base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self._data_root = os.path.join(self._base_dir, "data")
+        # folder_path -> PDF file names, reset ở đầu mỗi lần ingest
+        self._pdf_listing_cache: Dict[str, List[str]] = {}
+        
         # Qdrant configuration
         self.qdrant_url = os.getenv("QDRANT_URL")
         self.qdrant_api_key = os.getenv("QDRANT_API_KEY")
         self.client = QdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key)
+        # Async client + semaphore chỉ tồn tại trong một lần ingest (xem _ingest_session)
+        self.aclient = None
+        self._upsert_semaphore = None
+        # Process pool load PDF dùng chung cho mọi topic folder trong một lần ingest
+        self._pdf_pool = None
+        # Pool cho search nhiều collections song song
+        self._search_pool = ThreadPoolExecutor(max_workers=len(self.TOPIC_COLLECTIONS))
+        
+        # Flat (topic, keyword) theo thứ tự TOPIC_KEYWORDS cho fallback substring
+        self._flat_keywords = tuple(
+            (collection.removeprefix("robusta_"), keyword)
+            for collection, keywords in self.TOPIC_KEYWORDS.items()
+            for keyword in keywords
+        )
+        
+        # Automaton quét topic keywords một lượt, value = (thứ tự collection, topic)
+        self._topic_automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for order, (collection, keywords) in enumerate(self.TOPIC_KEYWORDS.items()):
+                for keyword in keywords:
+                    current = automaton.get(keyword, None)
+                    if current is None or order < current[0]:
+                        automaton.add_word(keyword, (order, collection.replace("robusta_", "")))
+            automaton.make_automaton()
+            self._topic_automaton = automaton
         
         # Embeddings
-        self.embeddings = llm_manager.get_embeddings()
+        self.embeddings = get_llm_manager().get_embeddings()
         
         # Text processing - Adjusted for course content
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "1200"))  # Larger chunks for course content
@@ -85,29 +159,40 @@ class TopicVectorDB:
         self.text_cleaner = TextCleaner()
         self.course_extractor = CourseInfoExtractor()
         
-    def create_topic_collections(self):
-        """Tạo tất cả collections cho các topic"""
+    def create_topic_collections(self, indexing_threshold: int = INDEXING_THRESHOLD):
+        """Tạo tất cả collections cho các topic (indexing_threshold=0 nếu ngay sau đó bulk upload + finalize_bulk_upload)"""
         for topic_folder, collection_name in self.TOPIC_COLLECTIONS.items():
-            self._create_collection(collection_name)
-            print(f"✅ Created collection: {collection_name}")
+            self._ensure_collection(collection_name, recreate=True, indexing_threshold=indexing_threshold)
     
-    def _create_collection(self, collection_name: str):
-        """Tạo một collection với cấu hình chuẩn"""
+    def _ensure_collection(self, collection_name: str, recreate: bool = False, indexing_threshold: int = INDEXING_THRESHOLD):
+        """Tạo collection nếu chưa có (recreate=True để xóa và tạo lại) - indexing_threshold=0 chỉ dùng cho bulk upload"""
         try:
+            exists = self.client.collection_exists(collection_name)
+            if exists and not recreate:
+                return
+            
             # Delete existing collection if exists
-            try:
+            if exists:
                 self.client.delete_collection(collection_name)
                 print(f"🗑️  Deleted existing collection: {collection_name}")
-            except:
-                pass
             
             # Create new collection
             self.client.create_collection(
                 collection_name=collection_name,
                 vectors_config=VectorParams(
                     size=768,  # Gemini text-embedding-004 dimensions
-                    distance=Distance.COSINE
-                )
+                    distance=Distance.COSINE,
+                    on_disk=True  # Vectors gốc (fp32) nằm trên disk
+                ),
+                # int8 quantized vectors giữ trong RAM cho search, ~4x nhỏ hơn fp32
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(
+                        type=ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True
+                    )
+                ),
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=indexing_threshold)
             )
             print(f"✅ Created collection: {collection_name}")
             
@@ -116,7 +201,8 @@ class TopicVectorDB:
     
     def upload_topic_data(self, data_folder: str = "data"):
         """Upload data theo từng topic folder"""
-        data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), data_folder)
+        data_path = os.path.join(self._base_dir, data_folder)
+        self._pdf_listing_cache.clear()
         
         if not os.path.exists(data_path):
             print(f"❌ Data folder not found: {data_path}")
@@ -126,14 +212,52 @@ class TopicVectorDB:
         self._process_text_files(data_path)
         
         # Process PDF files by topic folders
-        for topic_folder, collection_name in self.TOPIC_COLLECTIONS.items():
-            topic_path = os.path.join(data_path, topic_folder)
-            
-            if os.path.exists(topic_path):
-                print(f"\n📂 Processing topic: {topic_folder}")
-                self._process_topic_folder(topic_path, collection_name, topic_folder)
-            else:
-                print(f"⚠️  Topic folder not found: {topic_path}")
+        self.prepare_bulk_upload()
+        asyncio.run(self._aupload_topic_folders(data_path))
+        
+        self.finalize_bulk_upload()
+    
+    async def _aupload_topic_folders(self, data_path: str):
+        """Process tuần tự các topic folder trong một ingest session (dùng chung AsyncQdrantClient + PDF pool)"""
+        async with self._ingest_session():
+            for topic_folder, collection_name in self.TOPIC_COLLECTIONS.items():
+                topic_path = os.path.join(data_path, topic_folder)
+                
+                if os.path.exists(topic_path):
+                    print(f"\n📂 Processing topic: {topic_folder}")
+                    await self._aprocess_topic_folder(topic_path, collection_name, topic_folder)
+                else:
+                    print(f"⚠️  Topic folder not found: {topic_path}")
+    
+    def prepare_bulk_upload(self):
+        """Tắt HNSW indexing cho các topic collections trước bulk upload (finalize_bulk_upload bật lại)"""
+        for collection_name in self.TOPIC_COLLECTIONS.values():
+            try:
+                if not self.client.collection_exists(collection_name):
+                    self._ensure_collection(collection_name, indexing_threshold=0)
+                    continue
+                self.client.update_collection(
+                    collection_name=collection_name,
+                    optimizer_config=OptimizersConfigDiff(indexing_threshold=0)
+                )
+            except Exception as e:
+                print(f"❌ Error disabling indexing for {collection_name}: {e}")
+    
+    def finalize_bulk_upload(self):
+        """Bật lại indexing cho các topic collections sau khi bulk upload xong"""
+        before = self.get_collection_stats()
+        for collection_name in self.TOPIC_COLLECTIONS.values():
+            try:
+                self.client.update_collection(
+                    collection_name=collection_name,
+                    optimizer_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
+                )
+            except Exception as e:
+                print(f"❌ Error re-enabling indexing for {collection_name}: {e}")
+        
+        after = self.get_collection_stats()
+        for collection_name, stats in after.items():
+            print(f"📈 {collection_name}: {before[collection_name].get('points_count', 'n/a')} -> {stats.get('points_count', 'n/a')} points, indexing_threshold={INDEXING_THRESHOLD}")
     
     def _process_text_files(self, data_path: str):
         """Process chính sách và ưu đãi files"""
@@ -142,20 +266,39 @@ class TopicVectorDB:
         
         # Upload to policies collection (reuse existing)
         if os.path.exists(policy_file):
-            with open(policy_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self._upload_text_content(content, "robusta_policies", "policy", "Chính sách và học vụ")
+            self._upload_text_content(self._iter_text_chunks(policy_file), "robusta_policies", "policy", "Chính sách và học vụ")
         
         if os.path.exists(promotion_file):
-            with open(promotion_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            self._upload_text_content(content, "robusta_promotions", "promotion", "Ưu đãi khuyến mãi")
+            self._upload_text_content(self._iter_text_chunks(promotion_file), "robusta_promotions", "promotion", "Ưu đãi khuyến mãi")
+    
+    def _iter_text_chunks(self, file_path: str):
+        """Đọc file theo dòng và yield chunks dần dần thay vì f.read() cả file rồi split"""
+        buffer = ""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                buffer += line
+                if len(buffer) >= self.chunk_size * 4:
+                    chunks = self.text_splitter.split_text(buffer)
+                    # Chunk cuối có thể bị cắt giữa chừng - giữ lại ghép với phần đọc tiếp
+                    yield from chunks[:-1]
+                    buffer = chunks[-1] + "\n" if chunks else ""
+        
+        if buffer.strip():
+            yield from self.text_splitter.split_text(buffer)
+    
+    def _list_pdfs(self, folder_path: str) -> List[str]:
+        """Tên các PDF file trong folder, cache để verify + process không listdir lại"""
+        pdf_files = self._pdf_listing_cache.get(folder_path)
+        if pdf_files is None:
+            pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
+            self._pdf_listing_cache[folder_path] = pdf_files
+        return pdf_files
     
     def verify_all_files_processing(self):
         """Verify ALL files trong ALL topics được discovered và processed"""
         print("\n🔍 VERIFYING ALL FILES PROCESSING...")
         
-        base_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        base_data_path = self._data_root
         topics = {
             "virtualization": "Ảo hóa",
             "bigdata": "BigData", 
@@ -167,7 +310,7 @@ class TopicVectorDB:
         for topic_key, topic_display in topics.items():
             folder_path = os.path.join(base_data_path, topic_display)
             if os.path.exists(folder_path):
-                pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
+                pdf_files = self._list_pdfs(folder_path)
                 total_discovered += len(pdf_files)
                 print(f"📁 {topic_display}: {len(pdf_files)} PDF files discovered")
                 for pdf_file in pdf_files:
@@ -179,22 +322,29 @@ class TopicVectorDB:
         return total_discovered
 
     def _process_topic_folder(self, folder_path: str, collection_name: str, topic_name: str):
+        """Sync wrapper cho _aprocess_topic_folder"""
+        asyncio.run(self._in_ingest_session(self._aprocess_topic_folder(folder_path, collection_name, topic_name)))
+    
+    async def _aprocess_topic_folder(self, folder_path: str, collection_name: str, topic_name: str):
         """Process tất cả PDF files trong một topic folder với 3 sections cố định"""
         processed_count = 0
         total_sections = 0
-        pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
+        pdf_files = self._list_pdfs(folder_path)
         
         print(f"\n📁 Processing folder: {folder_path}")
         print(f"📊 Found {len(pdf_files)} PDF files to process")
         
-        for file_name in pdf_files:
-            file_path = os.path.join(folder_path, file_name)
-            
+        # Gom sections của mọi file trong folder rồi embed + upload một lần
+        pending_documents = []
+        
+        # Load và process mọi PDF song song trên nhiều process (parse PDF là CPU-bound)
+        pdf_paths = [os.path.join(folder_path, file_name) for file_name in pdf_files]
+        loaded_documents = await asyncio.to_thread(self._load_pdfs_parallel, pdf_paths)
+        
+        for file_path, file_name, documents in zip(pdf_paths, pdf_files, loaded_documents):
             try:
                 print(f"\n📄 Processing: {file_name}")
                 
-                # Load and process PDF để có 3 documents cố định
-                documents = self.pdf_loader.load_pdf_file(file_path)
                 if not documents:
                     print(f"⚠️  Empty content: {file_name}")
                     continue
@@ -222,10 +372,7 @@ class TopicVectorDB:
                     print("   Attempting re-extraction with fallback...")
                     
                     # Thử extraction lại với fallback method
-                    from langchain_community.document_loaders import PyPDFLoader
-                    loader = PyPDFLoader(file_path)
-                    pages = loader.load()
-                    full_text = "\n".join([page.page_content for page in pages])
+                    full_text = self._extract_raw_text(file_path)
                     
                     # Debug: show raw text
                     print(f"   Raw text length: {len(full_text)}")
@@ -249,31 +396,59 @@ class TopicVectorDB:
                     print(f"⚠️  Expected 3 sections, got {len(documents)} for {file_name}")
                     # Continue anyway, upload what we have
                 
-                # Upload từng document section
-                course_name = os.path.splitext(file_name)[0]
-                uploaded_sections = 0
-                
-                for doc in documents:
-                    try:
-                        self._upload_document_section(doc, collection_name, topic_name)
-                        uploaded_sections += 1
-                    except Exception as e:
-                        print(f"❌ Error uploading section {doc.metadata.get('section', 'unknown')}: {e}")
-                
-                if uploaded_sections > 0:
-                    processed_count += 1
-                    total_sections += uploaded_sections
-                    print(f"✅ Uploaded: {file_name} ({uploaded_sections} sections)")
-                else:
-                    print(f"❌ Failed to upload any sections for: {file_name}")
+                pending_documents.extend(documents)
+                processed_count += 1
+                print(f"✅ Queued: {file_name} ({len(documents)} sections)")
                 
             except Exception as e:
                 print(f"❌ Error processing {file_name}: {e}")
                 import traceback
                 traceback.print_exc()
         
+        if pending_documents:
+            total_sections = await self._aupload_document_sections(pending_documents, collection_name, topic_name)
+        
         print(f"📊 Topic {topic_name}: {processed_count} files processed, {total_sections} sections uploaded")
     
+    def _extract_raw_text(self, file_path: str) -> str:
+        """Raw text của cả PDF cho fallback extraction - pypdfium2 nếu có, không thì PyPDFLoader"""
+        if USE_PDFIUM and pdfium is not None:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                return "\n".join(pdf[i].get_textpage().get_text_range() for i in range(len(pdf)))
+            finally:
+                pdf.close()
+        
+        from langchain_community.document_loaders import PyPDFLoader
+        pages = PyPDFLoader(file_path).load()
+        return "\n".join([page.page_content for page in pages])
+    
+    def _load_pdfs_parallel(self, pdf_paths: List[str]) -> List[list]:
+        """Load các PDF trong folder song song bằng process pool của ingest session (hoặc pool tạm), lỗi pool thì load tuần tự"""
+        if len(pdf_paths) <= 1:
+            return [self.pdf_loader.load_pdf_file(path) for path in pdf_paths]
+        
+        try:
+            if self._pdf_pool is not None:
+                return list(self._pdf_pool.map(load_pdf_worker, pdf_paths))
+            with self._new_pdf_pool(min(len(pdf_paths), os.cpu_count() or 1)) as pool:
+                return list(pool.map(load_pdf_worker, pdf_paths))
+        except Exception as e:
+            print(f"⚠️  Parallel PDF loading failed, falling back to sequential: {e}")
+            return [self.pdf_loader.load_pdf_file(path) for path in pdf_paths]
+    
+    @staticmethod
+    def _new_pdf_pool(max_workers: int) -> ProcessPoolExecutor:
+        """ProcessPoolExecutor dùng forkserver/spawn - không fork process đang có thread gRPC embedding chạy"""
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    
+    @staticmethod
+    def _newline_cut(text: str, position: int, max_shift: int = 500) -> int:
+        """Vị trí ngay sau newline đầu tiên trong max_shift ký tự từ position (để không cắt giữa dòng), position nếu không có"""
+        newline = text.find("\n", position, position + max_shift)
+        return newline + 1 if newline != -1 else position
+    
     def _create_fallback_sections(self, full_text: str, file_name: str):
         """Tạo 3 sections cơ bản từ raw text khi extraction thất bại"""
         from langchain.schema import Document
@@ -281,161 +456,300 @@ class TopicVectorDB:
         # Clean course name
         course_name = os.path.splitext(file_name)[0]
         
-        # Split text into 3 roughly equal parts
+        # Split text into 3 roughly equal parts, cắt tại newline gần nhất sau mỗi mốc 1/3
         text_length = len(full_text)
         part_size = text_length // 3
+        cut1 = self._newline_cut(full_text, part_size)
+        cut2 = self._newline_cut(full_text, max(part_size * 2, cut1))
+        
+        section_parts = (
+            (full_text[:cut1], "section1_intro_duration", "Giới thiệu và Thời lượng (Fallback)"),
+            (full_text[cut1:cut2], "section2_objectives_audience", "Mục tiêu và Đối tượng (Fallback)"),
+            (full_text[cut2:], "section3_content_modules", "Nội dung và Modules (Fallback)")
+        )
         
         sections = []
+        for section_text, section, section_title in section_parts:
+            section_text = section_text.strip()
+            if section_text:
+                sections.append(Document(
+                    page_content=section_text,
+                    metadata={
+                        "course_name": course_name,
+                        "section": section,
+                        "section_title": section_title
+                    }
+                ))
         
-        # Section 1: First third
-        section1_text = full_text[:part_size].strip()
-        if section1_text:
-            sections.append(Document(
-                page_content=section1_text,
-                metadata={
-                    "course_name": course_name,
-                    "section": "section1_intro_duration",
-                    "section_title": "Giới thiệu và Thời lượng (Fallback)"
-                }
-            ))
+        print(f"   📋 Created {len(sections)} fallback sections from raw text")
+        return sections
+    
+    def _bulk_upload(self, collection_name: str, ids: list, vectors: list, payloads: list):
+        """Upload theo batch qua upload_collection thay vì upsert từng point"""
+        # Chỉ dùng worker processes khi mỗi worker có nhiều hơn một batch để upload
+        parallel = QDRANT_PARALLEL if len(ids) > QDRANT_BATCH_SIZE * QDRANT_PARALLEL else 1
+        self.client.upload_collection(
+            collection_name=collection_name,
+            vectors=vectors,
+            payload=payloads,
+            ids=ids,
+            batch_size=QDRANT_BATCH_SIZE,
+            parallel=parallel
+        )
+    
+    async def _aembed_and_upload(self, collection_name: str, ids: list, texts: List[str], payloads: list):
+        """Pipeline embed -> upsert: batch kế tiếp được embed trong khi batch trước đang upsert"""
+        # Sort theo độ dài để mỗi batch có texts dài tương đương (ít padding)
+        order = sorted(range(len(texts)), key=lambda idx: len(texts[idx]))
+        upload_tasks = []
+        
+        for start in range(0, len(order), EMBED_MAX_BATCH):
+            batch = order[start:start + EMBED_MAX_BATCH]
+            vectors = await asyncio.to_thread(self.embeddings.embed_documents, [texts[idx] for idx in batch])
+            upload_tasks.append(asyncio.create_task(self._aupload_points(
+                collection_name,
+                [ids[idx] for idx in batch],
+                vectors,
+                [payloads[idx] for idx in batch]
+            )))
+        
+        await asyncio.gather(*upload_tasks)
+    
+    def _embed_in_batches(self, texts: List[str], max_batch_size: int = EMBED_MAX_BATCH) -> List[List[float]]:
+        """embed_documents chia thành sub-batches để không vượt giới hạn mỗi request của provider"""
+        return [
+            vector
+            for start in range(0, len(texts), max_batch_size)
+            for vector in self.embeddings.embed_documents(texts[start:start + max_batch_size])
+        ]
+    
+    @contextlib.asynccontextmanager
+    async def _ingest_session(self):
+        """AsyncQdrantClient + upsert semaphore + PDF process pool cho một lần ingest, đóng khi xong (lồng nhau thì dùng lại)"""
+        if self.aclient is not None:
+            yield
+            return
         
-        # Section 2: Middle third
-        section2_text = full_text[part_size:part_size*2].strip()
-        if section2_text:
-            sections.append(Document(
-                page_content=section2_text,
-                metadata={
-                    "course_name": course_name,
-                    "section": "section2_objectives_audience",
-                    "section_title": "Mục tiêu và Đối tượng (Fallback)"
-                }
-            ))
+        self.aclient = AsyncQdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key)
+        self._upsert_semaphore = asyncio.Semaphore(UPSERT_CONCURRENCY)
+        self._pdf_pool = self._new_pdf_pool(os.cpu_count() or 1)
+        try:
+            yield
+        finally:
+            aclient, pdf_pool = self.aclient, self._pdf_pool
+            self.aclient = None
+            self._upsert_semaphore = None
+            self._pdf_pool = None
+            await asyncio.to_thread(pdf_pool.shutdown)
+            await aclient.close()
+    
+    async def _in_ingest_session(self, coro):
+        """Chạy coroutine trong _ingest_session - dùng cho các sync wrapper gọi asyncio.run"""
+        async with self._ingest_session():
+            return await coro
+    
+    async def _aupload_points(self, collection_name: str, ids: list, vectors: list, payloads: list):
+        """Upsert theo batch qua AsyncQdrantClient, tối đa UPSERT_CONCURRENCY request cùng lúc"""
+        if self.aclient is None:
+            async with self._ingest_session():
+                return await self._aupload_points(collection_name, ids, vectors, payloads)
+        aclient, semaphore = self.aclient, self._upsert_semaphore
+        
+        async def upsert_batch(start: int):
+            end = start + QDRANT_BATCH_SIZE
+            points = [
+                PointStruct(id=point_id, vector=vector, payload=payload)
+                for point_id, vector, payload in zip(ids[start:end], vectors[start:end], payloads[start:end])
+            ]
+            async with semaphore:
+                await aclient.upsert(collection_name=collection_name, points=points)
+        
+        await asyncio.gather(*(upsert_batch(start) for start in range(0, len(ids), QDRANT_BATCH_SIZE)))
+    
+    @staticmethod
+    def _section_id(course_name: str, section: str, content: str) -> str:
+        """Point ID deterministic theo course + section + nội dung - nội dung không đổi thì không cần embed lại"""
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{course_name}|{section}|{content}"))
+    
+    def _delete_stale_points(self, collection_name: str, field: str, ids_by_value: Dict[str, set]):
+        """Xóa points cũ có payload[field] == value mà ID không còn trong bộ IDs hiện tại của value đó"""
+        for value, ids in ids_by_value.items():
+            must_not = [HasIdCondition(has_id=list(ids))] if ids else None
+            try:
+                self.client.delete(
+                    collection_name=collection_name,
+                    points_selector=FilterSelector(filter=Filter(
+                        must=[FieldCondition(key=field, match=MatchValue(value=value))],
+                        must_not=must_not
+                    ))
+                )
+            except Exception as e:
+                print(f"⚠️  Could not delete stale points of {value}: {e}")
+    
+    def _existing_ids_in_collection(self, collection_name: str) -> set:
+        """Tất cả point IDs hiện có trong collection (scroll, không lấy payload/vectors)"""
+        existing_ids = set()
+        offset = None
+        try:
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=collection_name,
+                    limit=1000,
+                    offset=offset,
+                    with_payload=False,
+                    with_vectors=False
+                )
+                existing_ids.update(point.id for point in points)
+                if offset is None:
+                    break
+        except Exception as e:
+            print(f"⚠️  Could not fetch existing ids from {collection_name}: {e}")
+        return existing_ids
+    
+    def _prepare_section_content(self, document) -> Optional[str]:
+        """Nội dung sẽ embed của một section (handle short content), None nếu quá ngắn để upload"""
+        content = document.page_content.strip()
         
-        # Section 3: Last third
-        section3_text = full_text[part_size*2:].strip()
-        if section3_text:
-            sections.append(Document(
-                page_content=section3_text,
-                metadata={
-                    "course_name": course_name,
-                    "section": "section3_content_modules",
-                    "section_title": "Nội dung và Modules (Fallback)"
-                }
-            ))
+        # Handle very short content
+        if len(content) < 20:
+            print(f"   ⚠️  Skipping very short section: {document.metadata.get('section', 'unknown')}")
+            return None
         
-        print(f"   📋 Created {len(sections)} fallback sections from raw text")
-        return sections
+        # For short metadata sections, add context
+        if len(content) < 100 and content.startswith("Thông tin"):
+            content = f"Khóa học: {document.metadata['course_name']}\n\n{content}"
+            print(f"   📝 Enhanced short section with course context")
+        
+        return content
     
-    def _upload_document_section(self, document, collection_name: str, topic_name: str):
-        """Upload một document section với metadata chính xác và handle short content"""
+    async def _aupload_document_sections(self, documents, collection_name: str, topic_name: str) -> int:
+        """Upload các document sections với metadata chính xác - embed theo batch, upsert song song qua AsyncQdrantClient"""
         try:
-            content = document.page_content.strip()
-            
-            # Handle very short content
-            if len(content) < 20:
-                print(f"   ⚠️  Skipping very short section: {document.metadata.get('section', 'unknown')}")
-                return
+            # ID theo course + section + nội dung (gộp trùng trong batch), nhóm theo course để dọn points cũ
+            sections_by_id = {}
+            ids_by_course: Dict[str, set] = {}
+            for document in documents:
+                course_ids = ids_by_course.setdefault(document.metadata["course_name"], set())
+                content = self._prepare_section_content(document)
+                if content is not None:
+                    point_id = self._section_id(document.metadata["course_name"], document.metadata["section"], content)
+                    sections_by_id[point_id] = (document, content)
+                    course_ids.add(point_id)
             
-            # For short metadata sections, add context
-            if len(content) < 100 and content.startswith("Thông tin"):
-                content = f"Khóa học: {document.metadata['course_name']}\n\n{content}"
-                print(f"   📝 Enhanced short section with course context")
+            # Bỏ qua sections có nội dung không đổi (ID đã có trong collection)
+            existing_ids = await asyncio.to_thread(self._existing_ids_in_collection, collection_name)
+            ids = [point_id for point_id in sections_by_id if point_id not in existing_ids]
+            skipped = len(documents) - len(ids)
+            if skipped:
+                print(f"   ⏭️  Skipped {skipped} unchanged/short/duplicate sections")
             
-            # Create embedding
-            embedding = self.embeddings.embed_query(content)
-            
-            # Tạo point với metadata gọn gàng
-            point = PointStruct(
-                id=hash(f"{document.metadata['course_name']}_{document.metadata['section']}") % (2**31),
-                vector=embedding,
-                payload={
-                    "content": content,
-                    "course_name": document.metadata["course_name"],
-                    "topic": topic_name,
-                    "section": document.metadata["section"],
-                    "section_title": document.metadata["section_title"],
-                    "content_length": len(content)  # Add length for debugging
-                }
-            )
+            if ids:
+                sections = [sections_by_id[point_id] for point_id in ids]
+                
+                # Payload gọn gàng
+                payloads = [
+                    {
+                        "content": content,
+                        "course_name": document.metadata["course_name"],
+                        "topic": topic_name,
+                        "section": document.metadata["section"],
+                        "section_title": document.metadata["section_title"],
+                        "content_length": len(content)  # Add length for debugging
+                    }
+                    for document, content in sections
+                ]
+                
+                # Embed + upload to Qdrant
+                await self._aembed_and_upload(collection_name, ids, [content for _, content in sections], payloads)
             
-            # Upload to Qdrant
-            self.client.upsert(collection_name=collection_name, points=[point])
+            # Upload thành công mới xóa sections cũ (nội dung đã đổi) của các course này
+            await asyncio.to_thread(self._delete_stale_points, collection_name, "course_name", ids_by_course)
+            return len(ids)
             
         except Exception as e:
-            print(f"❌ Error uploading document section: {e}")
-            # Don't raise - continue with other sections
+            print(f"❌ Error uploading document sections: {e}")
+            return 0
     
-    def _upload_text_content(self, content: str, collection_name: str, doc_type: str, title: str):
-        """Upload text content to collection"""
+    def _upload_text_content(self, chunks, collection_name: str, doc_type: str, title: str):
+        """Upload text chunks to collection - embed + upload từng batch ngay khi đủ chunks"""
         try:
-            # Ensure collection exists
-            self._create_collection(collection_name)
+            # Ensure collection exists (không xóa dữ liệu đã ingest)
+            self._ensure_collection(collection_name)
             
-            # Split text into chunks
-            chunks = self.text_splitter.split_text(content)
+            # Chunk có nội dung không đổi (ID đã có trong collection) thì không embed lại
+            existing_ids = self._existing_ids_in_collection(collection_name)
+            current_ids = set()
             
-            points = []
+            uploaded = 0
+            batch = []
             for i, chunk in enumerate(chunks):
                 if not chunk.strip():
                     continue
-                
-                # Create embedding
-                embedding = self.embeddings.embed_query(chunk)
-                
-                # Create point
-                point = PointStruct(
-                    id=i,
-                    vector=embedding,
-                    payload={
-                        "content": chunk,
-                        "type": doc_type,
-                        "title": title,
-                        "chunk_index": i,
-                        "collection": collection_name
-                    }
-                )
-                points.append(point)
+                point_id = self._section_id(title, doc_type, chunk)
+                if point_id in current_ids:
+                    continue
+                current_ids.add(point_id)
+                if point_id not in existing_ids:
+                    batch.append((point_id, i, chunk))
+                if len(batch) >= EMBED_MAX_BATCH:
+                    uploaded += self._upload_text_batch(batch, collection_name, doc_type, title)
+                    batch = []
+            if batch:
+                uploaded += self._upload_text_batch(batch, collection_name, doc_type, title)
             
-            # Upload to Qdrant
-            if points:
-                self.client.upsert(collection_name=collection_name, points=points)
-                print(f"✅ Uploaded {len(points)} chunks to {collection_name}")
+            # Upload xong mới xóa chunks cũ không còn trong file (file ngắn lại / ranh giới chunk đổi)
+            self._delete_stale_points(collection_name, "title", {title: current_ids})
+            
+            print(f"✅ Uploaded {uploaded} chunks to {collection_name} ({len(current_ids) - uploaded} unchanged)")
             
         except Exception as e:
             print(f"❌ Error uploading text content: {e}")
     
+    def _upload_text_batch(self, batch: list, collection_name: str, doc_type: str, title: str) -> int:
+        """Embed và upload một batch (point_id, chunk_index, chunk)"""
+        embeddings = self.embeddings.embed_documents([chunk for _, _, chunk in batch])
+        payloads = [
+            {
+                "content": chunk,
+                "type": doc_type,
+                "title": title,
+                "chunk_index": i,
+                "collection": collection_name
+            }
+            for _, i, chunk in batch
+        ]
+        
+        # Upload to Qdrant
+        self._bulk_upload(collection_name, [point_id for point_id, _, _ in batch], embeddings, payloads)
+        return len(batch)
+    
     def _upload_pdf_content(self, content: str, collection_name: str, file_name: str, 
                            topic: str, course_info: Dict[str, Any]):
         """Upload PDF content to topic collection với metadata gọn gàng"""
         try:
             # Split text into chunks
-            chunks = self.text_splitter.split_text(content)
+            chunks = [(i, chunk) for i, chunk in enumerate(self.text_splitter.split_text(content)) if chunk.strip()]
             
-            points = []
-            for i, chunk in enumerate(chunks):
-                if not chunk.strip():
-                    continue
-                
-                # Create embedding
-                embedding = self.embeddings.embed_query(chunk)
-                
-                # Metadata gọn gàng - chỉ những thông tin cần thiết
-                point = PointStruct(
-                    id=hash(f"{file_name}_{i}") % (2**31),  # Unique ID
-                    vector=embedding,
-                    payload={
-                        "content": chunk,
-                        "course_name": os.path.splitext(file_name)[0],
-                        "topic": topic,
-                        "chunk_index": i
-                    }
-                )
-                points.append(point)
+            # Create embeddings (một request cho cả file)
+            embeddings = self._embed_in_batches([chunk for _, chunk in chunks])
+            course_name = os.path.splitext(file_name)[0]
+            
+            # Metadata gọn gàng - chỉ những thông tin cần thiết
+            ids = [str(uuid.uuid5(POINT_ID_NAMESPACE, f"{file_name}|{i}")) for i, _ in chunks]  # Unique ID
+            payloads = [
+                {
+                    "content": chunk,
+                    "course_name": course_name,
+                    "topic": topic,
+                    "chunk_index": i
+                }
+                for i, chunk in chunks
+            ]
             
             # Upload to Qdrant
-            if points:
-                self.client.upsert(collection_name=collection_name, points=points)
-                print(f"✅ Uploaded {len(points)} chunks from {file_name}")
+            if chunks:
+                self._bulk_upload(collection_name, ids, embeddings, payloads)
+                print(f"✅ Uploaded {len(chunks)} chunks from {file_name}")
             
         except Exception as e:
             print(f"❌ Error uploading PDF content: {e}")
@@ -453,8 +767,8 @@ class TopicVectorDB:
             return []
         
         try:
-            # Create query embedding
-            query_embedding = self.embeddings.embed_query(query)
+            # Create query embedding (cached)
+            query_embedding = self._embed_query(query)
             
             # Search in Qdrant
             search_results = self.client.search(
@@ -465,33 +779,91 @@ class TopicVectorDB:
             )
             
             # Format results với metadata gọn gàng
-            results = []
-            for hit in search_results:
-                results.append({
-                    "content": hit.payload["content"],
-                    "score": hit.score,
-                    "course_name": hit.payload.get("course_name", ""),
-                    "topic": hit.payload.get("topic", ""),
-                    "collection": collection_name
-                })
-            
-            return results
+            return [self._format_hit(hit, collection_name) for hit in search_results]
             
         except Exception as e:
             print(f"❌ Error searching topic {topic}: {e}")
             return []
     
+    def search_multi_topic(self, query: str, topics: List[str], limit: int = 5) -> List[Dict[str, Any]]:
+        """Search nhiều topics: embed query một lần, search các collections song song rồi merge theo score"""
+        collection_names = list(dict.fromkeys(filter(None, map(self._get_collection_name, topics))))
+        if not collection_names:
+            return []
+        
+        try:
+            query_embedding = self._embed_query(query)
+            
+            def search_collection(collection_name: str):
+                return self.client.search(
+                    collection_name=collection_name,
+                    query_vector=query_embedding,
+                    limit=limit,
+                    with_payload=True
+                )
+            
+            results = [
+                self._format_hit(hit, collection_name)
+                for collection_name, hits in zip(collection_names, self._search_pool.map(search_collection, collection_names))
+                for hit in hits
+            ]
+            
+        except Exception as e:
+            print(f"❌ Error searching topics {topics}: {e}")
+            return []
+        
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results[:limit]
+    
+    @staticmethod
+    def _format_hit(hit, collection_name: str) -> Dict[str, Any]:
+        """Format một search hit với metadata gọn gàng"""
+        return {
+            "content": hit.payload["content"],
+            "score": hit.score,
+            "course_name": hit.payload.get("course_name", ""),
+            "topic": hit.payload.get("topic", ""),
+            "collection": collection_name
+        }
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding của query qua cùng cache với search (caller embed trước thì search không embed lại)"""
+        return self._embed_query(query)
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """embed_query với LRU cache module-level"""
+        with _QUERY_CACHE_LOCK:
+            embedding = _QUERY_CACHE.get(query)
+            if embedding is not None:
+                _QUERY_CACHE.move_to_end(query)
+                return embedding
+        
+        embedding = self.embeddings.embed_query(query)
+        with _QUERY_CACHE_LOCK:
+            _QUERY_CACHE[query] = embedding
+            if len(_QUERY_CACHE) > QUERY_CACHE_SIZE:
+                _QUERY_CACHE.popitem(last=False)
+        return embedding
+    
     def _detect_topic(self, query: str) -> str:
         """Auto-detect topic from query keywords"""
+        # Default to cloud if no specific topic detected
+        return self._match_topic(query) or "cloud"
+    
+    def _match_topic(self, query: str) -> Optional[str]:
+        """Topic đầu tiên có keyword xuất hiện trong query, None nếu không match"""
         query_lower = query.lower()
         
-        for collection, keywords in self.TOPIC_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in query_lower:
-                    return collection.replace("robusta_", "")
+        if self._topic_automaton is not None:
+            # Giữ semantics cũ: collection đứng trước trong TOPIC_KEYWORDS thắng
+            matches = [value for _, value in self._topic_automaton.iter(query_lower)]
+            return min(matches)[1] if matches else None
         
-        # Default to cloud if no specific topic detected
-        return "cloud"
+        for topic, keyword in self._flat_keywords:
+            if keyword in query_lower:
+                return topic
+        
+        return None
     
     def _get_collection_name(self, topic: str) -> Optional[str]:
         """Get collection name from topic"""
@@ -526,32 +898,44 @@ class TopicVectorDB:
         return stats
     
     def guaranteed_process_all_topics(self):
-        """GUARANTEED processing của ALL files trong ALL topics"""
+        """GUARANTEED processing của ALL files trong ALL topics (sync wrapper)"""
+        return asyncio.run(self.aguaranteed_process_all_topics())
+    
+    async def aguaranteed_process_all_topics(self):
+        """GUARANTEED processing của ALL files trong ALL topics - các topic chạy đồng thời"""
         print("\n🚀 GUARANTEED PROCESSING ALL TOPICS...")
         
-        # 1. Verify files first
+        # 1. Verify files first (listing được cache cho bước process)
+        self._pdf_listing_cache.clear()
         total_discovered = self.verify_all_files_processing()
         
-        # 2. Process all topics với full verification
-        topics_processed = 0
-        data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        # 2. Process all topics với full verification (tắt indexing trong lúc upload)
+        self.prepare_bulk_upload()
+        data_path = self._data_root
+        topic_tasks = []
         
         for topic_folder, collection_name in self.TOPIC_COLLECTIONS.items():
             topic_path = os.path.join(data_path, topic_folder)
             
             if os.path.exists(topic_path):
                 print(f"\n📂 GUARANTEED Processing topic: {topic_folder}")
-                self._process_topic_folder(topic_path, collection_name, topic_folder)
-                topics_processed += 1
+                topic_tasks.append(self._aprocess_topic_folder(topic_path, collection_name, topic_folder))
             else:
                 print(f"❌ Topic folder not found: {topic_path}")
         
-        # 3. Double check results
+        async with self._ingest_session():
+            await asyncio.gather(*topic_tasks)
+        topics_processed = len(topic_tasks)
+        
+        # 3. Re-enable HNSW indexing sau bulk upload
+        self.finalize_bulk_upload()
+        
+        # 4. Double check results
         print(f"\n📊 FINAL SUMMARY:")
         print(f"   Files discovered: {total_discovered}")
         print(f"   Topics processed: {topics_processed}")
         
-        # 4. Check if any files missed
+        # 5. Check if any files missed
         if total_discovered > 0:
             print("✅ ALL files should be processed!")
         else:
@@ -566,7 +950,12 @@ def search_course_db(query: str, k: int = 5, topic: str = None) -> List[Dict[str
     """
     try:
         # Use the singleton instance to search
-        results = topic_vectordb.search_by_topic(query=query, topic=topic, limit=k)
+        if topic is None and topic_vectordb._match_topic(query) is None:
+            # Không detect được topic - search mọi topic thay vì mặc định cloud
+            all_topics = [name.replace("robusta_", "") for name in topic_vectordb.TOPIC_COLLECTIONS.values()]
+            results = topic_vectordb.search_multi_topic(query=query, topics=all_topics, limit=k)
+        else:
+            results = topic_vectordb.search_by_topic(query=query, topic=topic, limit=k)
         
         # Convert to Document-like objects for compatibility
         from langchain.schema import Document